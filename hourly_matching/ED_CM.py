@@ -0,0 +1,179 @@
+import pandas as pd
+import pypsa
+from pypsa.descriptors import get_switchable_as_dense as as_dense
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .aliases import materialise_aliases, drop_aliases, resolved
+
+
+#########################################################################################
+# Add ramping limits
+
+
+#########################################################################################
+# extendable = False
+def shutdown_extendability(n):
+
+    logger.info("shutdown extendability")
+
+    n.generators.p_nom_extendable = False
+    n.links.p_nom_extendable = False
+    n.stores.e_nom_extendable = False
+    n.storage_units.p_nom_extendable = False
+    n.lines.s_nom_extendable = False
+
+def drop_empty_components(n):
+    """
+    Only drops empty generators. Important for CI gens.
+    """
+
+    logger.info("drop empty components")
+    
+    empty_comps = n.generators.index[n.generators.p_nom.values == 0]
+
+    logger.info(f"Empty components that will be removed: {list(empty_comps)}")
+
+    # CI generators keep the series of removed templates
+    materialise_aliases(n, empty_comps)
+
+    n.mremove("Generator",empty_comps)
+
+
+#########################################################################################
+# Build market model `m` directly from the nodal network
+#
+# Market model with single zones, built without copying and rewiring the lines, DC links
+# and AC/DC buses of the nodal network that would be removed anyway: the AC and DC buses
+# are mapped to their bidding zone (all to "BZ" by default), generators, storage units,
+# loads, stores and the remaining links are added once with their input series. Links
+# between two AC/DC buses (DC links, converter T-links) are grid branches like lines and
+# transformers. With several zones, the zones are connected by exchange links (capacity given
+# or the sum of the branch ratings between the zones), no grid branch is kept.
+
+def _grid_links(n, grid):
+
+    return n.links.bus0.isin(grid) & n.links.bus1.isin(grid)
+
+
+def _exchange_capacities(n, zones):
+    '''
+    Line, transformer and grid link ratings between zones, {(zone0, zone1): MW}
+    '''
+    links = n.links[_grid_links(n, zones.index)]
+    ratings = pd.concat([
+        n.lines.assign(rating=n.lines.s_nom * n.lines.s_max_pu)[["bus0", "bus1", "rating"]],
+        n.transformers.assign(rating=n.transformers.s_nom * n.transformers.s_max_pu)[["bus0", "bus1", "rating"]],
+        links.assign(rating=links.p_nom)[["bus0", "bus1", "rating"]],
+    ])
+    z0, z1 = ratings.bus0.map(zones), ratings.bus1.map(zones)
+    between = z0.notna() & z1.notna() & (z0 != z1)
+    pairs = pd.DataFrame({"a": z0, "b": z1})[between]
+    pairs = pd.DataFrame({"a": pairs.min(axis=1), "b": pairs.max(axis=1)})
+
+    return ratings.rating[between].groupby([pairs.a, pairs.b]).sum().to_dict()
+
+
+def _add_component(m, n, c, df):
+
+    if df.empty:
+        return
+
+    series = {attr: pnl[df.index.intersection(pnl.columns)] for attr, pnl in n.pnl(c).items()
+              if attr in n.component_attrs[c].index[n.component_attrs[c].status.str.startswith("Input")]
+              and not pnl.empty and len(df.index.intersection(pnl.columns))}
+    m.madd(c, df.index, **df, **series)
+
+
+def build_market_model(n, zones=None, exchange_capacity=None):
+    '''
+    Market model of nodal network `n`: AC/DC buses of `n` mapped to bidding zones.
+    `zones` maps buses to zone names (all buses to "BZ" if None), `exchange_capacity` gives
+    {(zone0, zone1): MW} between zones (default: branch ratings between the zones).
+    '''
+    logger.info("build market model")
+
+    grid = n.buses.index[n.buses.carrier.isin(["AC", "DC"])]
+    zones = pd.Series("BZ", index=grid) if zones is None else pd.Series(zones).reindex(grid).fillna("BZ")
+
+    m = pypsa.Network()
+    m.set_snapshots(n.snapshots)
+    m.snapshot_weightings = n.snapshot_weightings.copy()
+    m.madd("Carrier", n.carriers.index, **n.carriers)
+
+    # buses: one per zone, the other buses (H2, battery, ...) as they are
+    if zones.nunique() == 1 and zones.iloc[0] == "BZ":
+        m.madd("Bus", ["BZ"], x=10. , y=51.2 , country='DE', v_nom = 380 , carrier='AC')
+    else:
+        ac = n.buses.loc[grid].groupby(zones)
+        m.madd("Bus", ac.x.mean().index, x=ac.x.mean(), y=ac.y.mean(),
+               country=ac.country.agg(lambda s: s.mode().iat[0] if len(s.mode()) else ""),
+               v_nom=380, carrier="AC")
+    _add_component(m, n, "Bus", n.buses.drop(grid))
+
+    def to_zone(bus):
+        return bus.map(zones).fillna(bus)
+
+    for c in ["Generator", "StorageUnit", "Load", "Store"]:
+        df = n.df(c)
+        _add_component(m, n, c, df.assign(bus=to_zone(df.bus)))
+
+    # links other than the AC/DC grid (replaced by the exchange links), without the ones
+    # internal to a zone
+    links = n.links[~n.links.carrier.isin(["DC", "AC"]) & ~_grid_links(n, grid)]
+    links = links.assign(bus0=to_zone(links.bus0), bus1=to_zone(links.bus1))
+    _add_component(m, n, "Link", links[links.bus0 != links.bus1])
+
+    _add_component(m, n, "GlobalConstraint", n.global_constraints)
+
+    if zones.nunique() > 1:
+        capacity = _exchange_capacities(n, zones) if exchange_capacity is None else exchange_capacity
+        names = [f"{a} - {b} exchange" for a, b in capacity]
+        m.add("Carrier", "exchange")
+        m.madd("Link", names, bus0=[a for a, _ in capacity], bus1=[b for _, b in capacity],
+               p_nom=list(capacity.values()), p_min_pu=-1, carrier="exchange")
+        logger.info(f"market model: {zones.nunique()} zones, {len(names)} exchange links")
+
+    return m
+
+
+#########################################################################################
+# Build redispatch model `n`
+def prepare_congestion_management(m, n):
+
+    logger.info("prepare congestion management")
+
+    p = m.generators_t.p / m.generators.p_nom
+    n.generators_t.p_min_pu = p
+    n.generators_t.p_max_pu = p
+    drop_aliases(n)  # every generator has its own p_max_pu now
+
+    g_up = n.generators.copy()
+    g_down = n.generators.copy()
+
+    g_up.index = g_up.index.map(lambda x: x + " ramp up")
+    g_down.index = g_down.index.map(lambda x: x + " ramp down")
+
+    with resolved(m):
+        up = (
+            as_dense(m, "Generator", "p_max_pu") * m.generators.p_nom - m.generators_t.p
+        ).clip(0) / m.generators.p_nom
+    down = -m.generators_t.p / m.generators.p_nom
+
+    up.columns = up.columns.map(lambda x: x + " ramp up")
+    down.columns = down.columns.map(lambda x: x + " ramp down")
+
+    n.madd("Generator", g_up.index, p_max_pu=up, **g_up.drop("p_max_pu", axis=1))
+
+    n.madd(
+        "Generator",
+        g_down.index,
+        p_min_pu=down,
+        p_max_pu=0,
+        **g_down.drop(["p_max_pu", "p_min_pu"], axis=1)
+    );
+
+    # include if statement here ? remove here or adapt hourly_matching constraint
+    #n.mremove("Generator", n.generators[n.generators.index.str.contains("CI") & n.generators.index.str.contains("ramp")].index)
@@ -0,0 +1,7 @@
+'''
+Hourly matching of electrolysers in the German power system: capacity expansion, nodal
+dispatch, economic dispatch and congestion management with PyPSA.
+
+Importing the package is free of side effects and heavy imports, the stages are in
+hourly_matching.pipeline, the command line entry point in hourly_matching.cli.
+'''
@@ -1,9 +1,9 @@
-import pypsa
 import logging
 logger = logging.getLogger(__name__)
 
-# Suppress logging of the slack bus choices
-pypsa.pf.logger.setLevel(logging.WARNING)
+
+from .horizon import horizon_share
+from .component_roles import role_names
 
 
 
@@ -15,11 +15,11 @@ def add_battery_constraints(n):
     if not n.links.p_nom_extendable.any():
         return
 
-    discharger_bool = n.links.index.str.contains("battery discharger")
-    charger_bool = n.links.index.str.contains("battery charger")
+    dischargers = role_names(n, "Link", "battery_discharger")
+    chargers = role_names(n, "Link", "battery_charger")
 
-    dischargers_ext = n.links[discharger_bool].query("p_nom_extendable").index
-    chargers_ext = n.links[charger_bool].query("p_nom_extendable").index
+    dischargers_ext = dischargers[n.links.p_nom_extendable[dischargers].values]
+    chargers_ext = chargers[n.links.p_nom_extendable[chargers].values]
 
     eff = n.links.efficiency[dischargers_ext].values
     lhs = (
@@ -85,7 +85,10 @@ def country_res_constraints(n, config):
         # total electricity load
         total_load += demand_electrolysis
 
-    logger.info(f"country RES constraint for {ct} {target} and total load {round(total_load/1e6)} TWh")
+    # weighted sums cover the snapshot window, log the annualised load for comparison
+    annual_load = total_load / horizon_share(n)
+    logger.info(f"country RES constraint for {ct} {target} and total load {round(total_load/1e6)} TWh "
+                f"({round(annual_load/1e6)} TWh annualised)")
 
     n.model.add_constraints(lhs == target*total_load, name=f"country_res_constraints_{ct}")
 
@@ -98,21 +101,12 @@ def excess_constraints(n, h2buses_df, config):
     given constraint
     '''
 
-    h2buses = h2buses_df.index
-    
-    name = config['ci']['name']
     excess = 1 + config["scenario"]["excess"] / 100
 
-    ci_gens = list(n.generators[n.generators.index.str.contains("CI")].index)
-    res_gens = []
-    dummy_gens = []
-    for i in ci_gens:
-        if 'dummy' in i:
-            dummy_gens.append(i)
-        else:
-            res_gens.append(i)
-    res_dis = list(n.links[n.links.index.str.contains("CI battery discharger")].index)
-    res_ch = list(n.links[n.links.index.str.contains("CI battery charger")].index) 
+    res_gens = role_names(n, "Generator", "ci_res", config)
+    dummy_gens = role_names(n, "Generator", "ci_dummy", config)
+    res_dis = role_names(n, "Link", "ci_battery_discharger", config)
+    res_ch = role_names(n, "Link", "ci_battery_charger", config)
 
     weights = n.snapshot_weightings["generators"]
 
@@ -122,7 +116,7 @@ def excess_constraints(n, h2buses_df, config):
     if config["global"]["dummies"]:
         dummies = (n.model['Generator-p'].loc[:,dummy_gens] * weights).sum("Generator")
 
-    ely_links = [h2bus + " " + name + " H2 Electrolysis" for h2bus in h2buses]
+    ely_links = role_names(n, "Link", "electrolyser", config)
     electrolysis = (n.model['Link-p'].loc[:,ely_links] * weights).sum("Link")
 
     allowed_excess = 1
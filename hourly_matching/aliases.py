@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Availability series aliases
+#
+# A generator with the static attribute p_max_pu_alias = <template> has no p_max_pu column
+# of its own, it uses the p_max_pu series of the template generator (CI onwind/solar use the
+# series of the grid generator at the same bus). The columns are materialised only while a
+# model is built and solved or the network is exported (`resolved`), and permanently before
+# a template is removed.
+
+ALIAS = "p_max_pu_alias"
+
+
+def set_alias(n, name, template):
+    '''
+    Generator `name` uses the p_max_pu series of generator `template`
+    '''
+    if ALIAS not in n.generators:
+        n.generators[ALIAS] = ""
+    n.generators.loc[name, ALIAS] = template
+
+
+def aliased(n):
+    '''
+    Aliased generators without a p_max_pu column of their own -> template
+    '''
+    if ALIAS not in n.generators:
+        return pd.Series(dtype=object)
+
+    columns = n.generators_t.p_max_pu.columns
+    alias = n.generators[ALIAS].fillna("")
+    return alias[(alias != "") & alias.isin(columns) & ~alias.index.isin(columns)]
+
+
+def _materialise(n, alias):
+
+    if alias.empty:
+        return
+    p_max_pu = n.generators_t.p_max_pu
+    n.generators_t.p_max_pu = pd.concat([p_max_pu, p_max_pu[alias.values].set_axis(alias.index, axis=1)], axis=1)
+
+
+def materialise_aliases(n, templates=None):
+    '''
+    Give the generators aliasing one of `templates` (all if None) their own p_max_pu column,
+    e.g. before the templates are removed
+    '''
+    alias = aliased(n)
+    if templates is not None:
+        alias = alias[alias.isin(templates)]
+
+    _materialise(n, alias)
+    n.generators.loc[alias.index, ALIAS] = ""
+
+
+def drop_aliases(n):
+    '''
+    Remove the alias attribute, generators without a p_max_pu column fall back to the static value
+    '''
+    n.generators.drop(columns=ALIAS, errors="ignore", inplace=True)
+
+
+@contextmanager
+def resolved(n):
+    '''
+    Aliased p_max_pu columns materialised (and the alias attribute hidden) within the context
+    '''
+    alias = aliased(n)
+    if alias.empty:
+        yield
+        return
+
+    static = n.generators.pop(ALIAS)
+    _materialise(n, alias)
+    try:
+        yield
+    finally:
+        n.generators_t.p_max_pu = n.generators_t.p_max_pu.drop(columns=alias.index, errors="ignore")
+        n.generators[ALIAS] = static.reindex(n.generators.index).fillna("")
@@ -0,0 +1,119 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .config_keys import config_hash
+
+
+#########################################################################################
+# Reusable model artifacts
+#
+# A stage persists its fully built linopy model (with custom constraints and objective) as
+# <dir>/<stage>-<stage key>.nc. The linopy netCDF keeps variable and constraint names and
+# coordinates, so a solution of the artifact maps back onto the network.
+# The stage key covers the model-defining config (config_keys.model_config: network file,
+# reduction, market zones, weather years, ...) and the stage with the suffix of its run
+# mode, but not the solver settings.
+
+
+def stage_key(config, stage):
+    '''
+    Hash of the model-defining config and `stage`
+    '''
+    return config_hash({**config, "_stage": stage}, length=12)
+
+
+def artifact_path(config, stage):
+
+    return os.path.join(config["artifacts"]["dir"], f"{stage}-{stage_key(config, stage)}.nc")
+
+
+def persist_model(n, config, stage):
+    '''
+    Write the built model of `stage` if enabled in config["artifacts"]
+    '''
+    artifacts = config.get("artifacts", {})
+    if stage is None or not artifacts.get("enabled", False):
+        return
+    # stage names of the ref and 2019 runs carry the suffix of their result files (o2-19, n-r)
+    if stage.split("-")[0] not in artifacts["stages"]:
+        return
+
+    path = artifact_path(config, stage)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    logger.info(f"persist model of stage {stage} to {path}")
+    n.model.to_netcdf(path)
+
+
+#########################################################################################
+# Re-solve an artifact under several parameter sets
+def _solve_artifact(path, solver_name, params, i):
+
+    import linopy
+
+    m = linopy.read_netcdf(path)
+
+    start = time.time()
+    try:
+        status, condition = m.solve(solver_name=solver_name, **params)
+    except Exception as e:
+        status, condition = "error", str(e)
+    runtime = time.time() - start
+
+    solved = None
+    if status == "ok":
+        solved = path[:-3] + f"-{i}.solved.nc"
+        m.to_netcdf(solved)
+
+    return dict(run=i, params=params, status=status, condition=condition, runtime=runtime,
+                objective=m.objective.value if status == "ok" else None, solved=solved)
+
+
+def resolve_artifact(path, param_sets, solver_name="gurobi", processes=None):
+    '''
+    Solve the artifact at `path` once per parameter set in parallel.
+    Returns one row per run, fastest optimal run first.
+    '''
+    n_runs = len(param_sets)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_solve_artifact, [path] * n_runs, [solver_name] * n_runs,
+                                param_sets, range(n_runs)))
+
+    df = pd.DataFrame(results)
+    df["optimal"] = df.condition == "optimal"
+    return df.sort_values(["optimal", "runtime"], ascending=[False, True]).reset_index(drop=True)
+
+
+def load_solution(n, solved_path, objective=None):
+    '''
+    Assign the solution of a solved artifact to network `n` (built for the same stage)
+    '''
+    import linopy
+
+    n.model = linopy.read_netcdf(solved_path)
+    n.optimize.assign_solution()
+    n.optimize.assign_duals()
+    n.optimize.post_processing()
+    n.objective = n.model.objective.value if objective is None else objective
+
+
+def resolve_and_load(n, config, stage, param_sets, solver_name="gurobi", processes=None):
+    '''
+    Re-solve the artifact of `stage` under `param_sets` and load the fastest optimal solution into `n`
+    '''
+    runs = resolve_artifact(artifact_path(config, stage), param_sets, solver_name, processes)
+
+    best = runs.iloc[0]
+    if not best.optimal:
+        raise RuntimeError(f"no parameter set solved stage {stage} to optimality")
+
+    logger.info(f"stage {stage}: fastest parameter set {best.params} ({round(best.runtime)} s)")
+    load_solution(n, best.solved, best.objective)
+
+    return runs
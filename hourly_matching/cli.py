@@ -0,0 +1,443 @@
+import argparse
+import itertools
+import logging
+import multiprocessing
+import warnings
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Command line entry point
+#
+#   python -m hourly_matching run [--mode scenario|ref|2019] [--until STAGE] [--set key=value]
+#                                 [--profile STAGE]    profiles in <results_dir>/profiles/
+#   python -m hourly_matching resume ...        stages with a result file are loaded, not solved
+#   python -m hourly_matching stage m ...       one stage, predecessors from the results directory
+#   python -m hourly_matching sweep --grid scenario.ely_cap=6000,8000,10000 [--processes 3]
+#   python -m hourly_matching screen [--relaxation]   necessary feasibility checks, no full solve
+#   python -m hourly_matching whatif --line 123=2500  CM stage re-solved with a new line rating
+#   python -m hourly_matching years [--processes 4]   expansion once, dispatch per weather year
+#   python -m hourly_matching sample [--processes 4]  sampled parameter ranges, KPI surrogates
+#   python -m hourly_matching kpis DIR [DIR ...] [--suffix=-r] [--out kpis.csv]   KPIs of solved runs
+#   python -m hourly_matching sensitivity DIR [DIR ...] [--stage o] [--suffix=-r]  dual-based report
+#   python -m hourly_matching compare COMPACT_DIR REFERENCE_DIR [--rtol 1e-4]    compact vs full precision
+#   python -m hourly_matching predict surrogate.yaml [--set key=value]   KPIs from a sampling surrogate
+#   python -m hourly_matching artifact ARTIFACT.nc params.yaml [--solver gurobi]  re-solve per parameter set
+#
+# The pipeline (pypsa, linopy, ...) is imported inside the commands only, a sweep spawns one
+# fresh worker process per scenario.
+
+STAGE_NAMES = ["o", "o2", "m", "n", "n_custom"]
+
+
+def parse_assignments(items):
+    '''
+    ["scenario.ely_cap=8000", ...] -> {"scenario.ely_cap": 8000, ...}, values parsed as yaml
+    '''
+    overrides = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        overrides[key] = yaml.safe_load(value)
+    return overrides
+
+
+def parse_grid(items):
+    '''
+    ["scenario.ely_cap=6000,8000", ...] -> list of override dicts, one per combination
+    '''
+    keys, values = [], []
+    for item in items or []:
+        key, _, value = item.partition("=")
+        keys.append(key)
+        values.append([yaml.safe_load(v) for v in value.split(",")])
+
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def setup_logging(config):
+
+    logging.basicConfig(level=config["logging_level"])
+
+    import pandas as pd
+    import pypsa
+
+    # Suppress logging of the slack bus choices
+    pypsa.pf.logger.setLevel(logging.WARNING)
+    warnings.simplefilter(action='ignore', category=pd.errors.PerformanceWarning)
+
+
+def run_task(config_path, overrides, mode, resume=False, until=None, only=None):
+    '''
+    One pipeline run (also the worker of a sweep)
+    '''
+    from .pipeline import load_config, run
+
+    config = load_config(config_path, overrides)
+    setup_logging(config)
+    run(config, mode=mode, resume=resume, until=until, only=only)
+
+
+def report(overrides, get):
+
+    try:
+        get()
+        logger.info(f"sweep: {overrides} done")
+        return True
+    except Exception as e:
+        logger.error(f"sweep: {overrides} failed ({e})")
+        return False
+
+
+def sweep_warm(pool, config_path, grid, mode, resume=False, until=None, processes=None):
+    '''
+    Sweep in chains of similar scenarios, each run warm started from its predecessor
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    from .pipeline import load_config, results_dir_for
+    from .warmstart import sweep_chains
+
+    chains = sweep_chains(grid, processes or multiprocessing.cpu_count())
+    logger.info(f"sweep: {len(grid)} scenarios in {len(chains)} warm-started chains")
+
+    def run_chain(chain):
+
+        previous = None
+        for i in chain:
+            overrides = dict(grid[i])
+            if previous is not None:
+                overrides["solving.warmstart.from"] = results_dir_for(load_config(config_path, previous), mode)
+            args = (config_path, overrides, mode, resume, until)
+            # a failed scenario is no warm start for the next one
+            if report(grid[i], lambda: pool.apply(run_task, args)):
+                previous = grid[i]
+
+    with ThreadPoolExecutor(max_workers=len(chains) or 1) as threads:
+        list(threads.map(run_chain, chains))
+
+
+def screen_task(config_path, overrides, stride):
+    '''
+    Time-aggregated relaxation of one sweep point (worker), True if rejected
+    '''
+    from .pipeline import load_config
+    from .screening import screen_relaxation, rejected
+
+    config = load_config(config_path, overrides)
+    setup_logging(config)
+    return rejected(screen_relaxation(config, stride))
+
+
+def screen_grid(pool, config_path, grid, n, screening):
+    '''
+    Sweep points that pass the screening, `n` is the input network
+    '''
+    from .pipeline import load_config
+    from .horizon import set_horizon
+    from .screening import screen, rejected
+
+    set_horizon(n, load_config(config_path, grid[0] if grid else None))
+
+    kept = []
+    for overrides in grid:
+        if rejected(screen(load_config(config_path, overrides), n)):
+            logger.warning(f"sweep: {overrides} rejected by screening")
+        else:
+            kept.append(overrides)
+
+    if screening.get("relaxation", False):
+        results = [pool.apply_async(screen_task, (config_path, overrides, screening.get("stride", 24)))
+                   for overrides in kept]
+        failed = []
+        for overrides, r in zip(kept, results):
+            try:
+                failed.append(r.get())
+            except Exception as e:
+                # an error of the screening itself says nothing about the scenario
+                logger.error(f"sweep: aggregated expansion of {overrides} failed ({e!r}), kept")
+                failed.append(False)
+        for overrides in [o for o, f in zip(kept, failed) if f]:
+            logger.warning(f"sweep: {overrides} rejected by aggregated expansion")
+        kept = [o for o, f in zip(kept, failed) if not f]
+
+    logger.info(f"sweep: {len(kept)} of {len(grid)} scenarios pass the screening")
+    return kept
+
+
+def screen_command(config_path, overrides, relaxation=False):
+
+    from .pipeline import load_config
+    from .network_cache import load_network
+    from .horizon import set_horizon
+    from .screening import screen
+
+    config = load_config(config_path, overrides)
+    setup_logging(config)
+
+    n = load_network(config["network_file"], config)
+    set_horizon(n, config)
+
+    findings = screen(config, n, relaxation, config.get("screening", {}).get("stride", 24))
+    for f in findings:
+        print(f"{f['level']:7s} {f['check']:22s} {f['message']}")
+    if not findings:
+        print("no findings")
+
+
+def years_command(config_path, overrides, mode, processes=None):
+
+    from .pipeline import load_config
+    from .years import run_years
+
+    config = load_config(config_path, overrides)
+    setup_logging(config)
+    print(run_years(config, mode, processes))
+
+
+def sample_command(config_path, overrides, mode, processes=None, solve=True):
+
+    from .pipeline import load_config
+    from .sampling import run_sampling
+
+    config = load_config(config_path, overrides)
+    setup_logging(config)
+
+    surrogate, indices = run_sampling(config_path, config, mode, processes, solve, overrides)
+    for kpi, s in surrogate["kpis"].items():
+        print(f"{kpi:24s} R2 {s['r2']:.3f}  leave-one-out R2 {s['r2_loo']:.3f}")
+    print(indices)
+
+
+def kpis_command(results_dirs, processes=None, suffix="", out="kpis.csv"):
+
+    from .postprocessing import process_results_dirs
+
+    logging.basicConfig(level=logging.INFO)
+    process_results_dirs(results_dirs, processes, suffix).to_csv(out, index=False)
+    logger.info(f"KPIs of {len(results_dirs)} result directories written to {out}")
+
+
+def sensitivity_command(config_path, results_dirs, stage="o", suffix=""):
+
+    from .sensitivity import results_dir_report
+
+    with open(config_path, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    for results_dir in results_dirs:
+        print(results_dir)
+        print(results_dir_report(results_dir, config, stage, suffix))
+
+
+def compare_command(compact_dir, reference_dir, suffix="", rtol=1e-4):
+
+    from .compact import compare_results_dirs
+
+    print(compare_results_dirs(compact_dir, reference_dir, suffix, rtol))
+
+
+def predict_command(surrogate_path, values):
+    '''
+    KPIs of a surrogate at `values`, parameters not given at the centre of their range
+    '''
+    import pandas as pd
+    from .sampling import load_surrogate, predict
+
+    surrogate = load_surrogate(surrogate_path)
+    point = {k: (lo + hi) / 2 for k, (lo, hi) in surrogate["bounds"].items()}
+    point.update({k: float(v) for k, v in values.items()})
+
+    print(predict(surrogate, pd.DataFrame([point])).T)
+
+
+def artifact_command(artifact, params_path, solver="gurobi", processes=None):
+
+    from .artifacts import resolve_artifact
+
+    with open(params_path, "r") as f:
+        param_sets = yaml.load(f, Loader=yaml.FullLoader)
+
+    logging.basicConfig(level=logging.INFO)
+    print(resolve_artifact(artifact, param_sets, solver, processes).to_string())
+
+
+def whatif_command(config_path, overrides, mode, stage, changes, solve=True):
+
+    from .pipeline import load_config
+    from .whatif import what_ifs
+
+    config = load_config(config_path, overrides)
+    setup_logging(config)
+
+    changes = {c: v for c, v in changes.items() if v}
+    result = what_ifs(config, {"whatif": {"changes": changes}}, stage, mode, solve)["whatif"]
+    print(result["estimate"])
+    if "kpis" in result:
+        print(result["kpis"])
+
+
+def sweep(config_path, grid, mode, resume=False, until=None, processes=None):
+    '''
+    Run every combination of `grid`, each in a fresh spawned process.
+    With network_cache.shared_memory the input network is loaded once here and shared.
+    '''
+    from .pipeline import load_config
+
+    config = load_config(config_path, grid[0] if grid else None)
+    initializer, initargs, blocks = None, (), []
+
+    shared = config.get("network_cache", {}).get("shared_memory", False)
+    screening = config.get("screening", {}).get("enabled", False) and mode == "scenario"
+
+    if shared or screening:
+        from .network_cache import load_network, share_network, use_shared_network
+
+        path = config["s2019"]["network_file"] if mode == "2019" else config["network_file"]
+        n = load_network(path, config)
+
+    if shared:
+        spec, blocks = share_network(n, config)
+        initializer, initargs = use_shared_network, (path, spec)
+
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ctx.Pool(processes=processes, maxtasksperchild=1,
+                      initializer=initializer, initargs=initargs) as pool:
+            if screening:
+                grid = screen_grid(pool, config_path, grid, n, config["screening"])
+
+            if config["solving"].get("warmstart", {}).get("enabled", False):
+                sweep_warm(pool, config_path, grid, mode, resume, until, processes)
+            else:
+                results = [pool.apply_async(run_task, (config_path, overrides, mode, resume, until))
+                           for overrides in grid]
+                for overrides, result in zip(grid, results):
+                    report(overrides, result.get)
+    finally:
+        from .network_cache import release_network
+        release_network(blocks)
+
+
+def parser():
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", default="config.yaml")
+    common.add_argument("--mode", default="scenario", choices=["scenario", "ref", "2019"])
+    common.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="config override with a dotted key, e.g. scenario.ely_cap=8000")
+
+    p = argparse.ArgumentParser(prog="hourly_matching", description="Hourly matching ED and CM pipeline")
+    commands = p.add_subparsers(dest="command", required=True)
+
+    profile = argparse.ArgumentParser(add_help=False)
+    profile.add_argument("--profile", action="append", default=[], choices=STAGE_NAMES, metavar="STAGE",
+                         help="profile the stage (profiling.mode of the config, sampling by default)")
+
+    c = commands.add_parser("run", parents=[common, profile], help="run all stages")
+    c.add_argument("--until", choices=STAGE_NAMES, default=None)
+
+    c = commands.add_parser("resume", parents=[common, profile], help="run, loading stages with a result file")
+    c.add_argument("--until", choices=STAGE_NAMES, default=None)
+
+    c = commands.add_parser("stage", parents=[common, profile], help="run one stage, predecessors from result files")
+    c.add_argument("stage", choices=STAGE_NAMES)
+
+    c = commands.add_parser("sweep", parents=[common], help="run a grid of config overrides in parallel")
+    c.add_argument("--grid", action="append", default=[], metavar="KEY=V1,V2,...")
+    c.add_argument("--processes", type=int, default=None)
+    c.add_argument("--resume", action="store_true")
+    c.add_argument("--until", choices=STAGE_NAMES, default=None)
+
+    c = commands.add_parser("screen", parents=[common], help="check the scenario for infeasibility before solving")
+    c.add_argument("--relaxation", action="store_true", help="also solve a time-aggregated expansion")
+
+    c = commands.add_parser("years", parents=[common], help="expansion once, dispatch per weather year in parallel")
+    c.add_argument("--processes", type=int, default=None)
+
+    c = commands.add_parser("sample", parents=[common], help="sampled parameter ranges in parallel, KPI surrogates")
+    c.add_argument("--processes", type=int, default=None)
+    c.add_argument("--no-solve", action="store_true", help="refit the surrogates on solved samples")
+
+    c = commands.add_parser("kpis", help="KPIs of solved result directories")
+    c.add_argument("results_dirs", nargs="+")
+    c.add_argument("--processes", type=int, default=None)
+    c.add_argument("--suffix", default="", help="file suffix of the run mode, e.g. --suffix=-19 or --suffix=-r")
+    c.add_argument("--out", default="kpis.csv")
+
+    c = commands.add_parser("sensitivity", help="dual-based sensitivity report of solved stages")
+    c.add_argument("results_dirs", nargs="+")
+    c.add_argument("--config", default="config.yaml")
+    c.add_argument("--stage", default="o")
+    c.add_argument("--suffix", default="", help="file suffix of the run mode, e.g. --suffix=-19 or --suffix=-r")
+
+    c = commands.add_parser("compare", help="compare a compact run with a full-precision run")
+    c.add_argument("compact_dir")
+    c.add_argument("reference_dir")
+    c.add_argument("--suffix", default="", help="file suffix of the run mode, e.g. --suffix=-19 or --suffix=-r")
+    c.add_argument("--rtol", type=float, default=1e-4)
+
+    c = commands.add_parser("predict", help="KPIs of parameter values from a fitted surrogate")
+    c.add_argument("surrogate", help="surrogate.yaml of a sampling run")
+    c.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                   help="parameter value, e.g. global.co2_price_2030=150 (default: centre of the range)")
+
+    c = commands.add_parser("artifact", help="re-solve a model artifact under several solver parameter sets")
+    c.add_argument("artifact")
+    c.add_argument("params", help="yaml file with a list of solver option dicts")
+    c.add_argument("--solver", default="gurobi")
+    c.add_argument("--processes", type=int, default=None)
+
+    c = commands.add_parser("whatif", parents=[common], help="re-solve a solved CM stage with new line/link ratings")
+    c.add_argument("--stage", default="n", choices=["n", "n_custom"])
+    c.add_argument("--line", action="append", default=[], metavar="NAME=S_NOM")
+    c.add_argument("--link", action="append", default=[], metavar="NAME=P_NOM")
+    c.add_argument("--estimate-only", action="store_true", help="marginal effect from the duals, no re-solve")
+
+    return p
+
+
+def main(argv=None):
+
+    args = parser().parse_args(argv)
+    if args.command == "kpis":
+        kpis_command(args.results_dirs, args.processes, args.suffix, args.out)
+        return
+    if args.command == "sensitivity":
+        sensitivity_command(args.config, args.results_dirs, args.stage, args.suffix)
+        return
+    if args.command == "compare":
+        compare_command(args.compact_dir, args.reference_dir, args.suffix, args.rtol)
+        return
+    if args.command == "predict":
+        predict_command(args.surrogate, parse_assignments(args.set))
+        return
+    if args.command == "artifact":
+        artifact_command(args.artifact, args.params, args.solver, args.processes)
+        return
+
+    overrides = parse_assignments(args.set)
+    if getattr(args, "profile", None):
+        overrides.update({"profiling.enabled": True, "profiling.stages": args.profile})
+
+    if args.command == "run":
+        run_task(args.config, overrides, args.mode, until=args.until)
+    elif args.command == "resume":
+        run_task(args.config, overrides, args.mode, resume=True, until=args.until)
+    elif args.command == "stage":
+        run_task(args.config, overrides, args.mode, only=args.stage)
+    elif args.command == "screen":
+        screen_command(args.config, overrides, args.relaxation)
+    elif args.command == "years":
+        years_command(args.config, overrides, args.mode, args.processes)
+    elif args.command == "sample":
+        sample_command(args.config, overrides, args.mode, args.processes, not args.no_solve)
+    elif args.command == "whatif":
+        whatif_command(args.config, overrides, args.mode, args.stage,
+                       {"Line": parse_assignments(args.line), "Link": parse_assignments(args.link)},
+                       not args.estimate_only)
+    elif args.command == "sweep":
+        logging.basicConfig(level=logging.INFO)
+        grid = [{**overrides, **g} for g in parse_grid(args.grid)]
+        sweep(args.config, grid, args.mode, args.resume, args.until, args.processes)
@@ -0,0 +1,132 @@
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .solving import record
+
+
+#########################################################################################
+# Compact time series
+#
+# With config["compact"] enabled, the input time series (p_max_pu, p_set, ...) and the
+# derived per-unit tables (CM limits, fixed link dispatch of o2_temp) of every network are
+# held in a smaller float dtype. Before a model is built they are upcast to float64, after
+# the solve they are compacted again, so the model coefficients keep full precision.
+# The rounding of float32 is ~6e-8 relative; solution_difference compares a compact run
+# with a full-precision run.
+
+
+def _settings(config):
+
+    compact = config.get("compact", {})
+    if not compact.get("enabled", False):
+        return None
+    return compact
+
+
+def _tables(n, outputs=False):
+    '''
+    Float time series tables of `n`, inputs only unless `outputs`
+    '''
+    for c in n.iterate_components():
+        inputs = c.attrs.index[c.attrs.status.str.startswith("Input")]
+        for attr, df in c.pnl.items():
+            if df.empty or not (outputs or attr in inputs):
+                continue
+            if all(np.issubdtype(t, np.floating) for t in df.dtypes):
+                yield c.pnl, attr, df
+
+
+def series_memory(n):
+    '''
+    Memory [bytes] of all time series tables of `n`
+    '''
+    return sum(df.memory_usage(index=False).sum() for c in n.iterate_components() for df in c.pnl.values())
+
+
+def compact_series(n, config, label=None):
+    '''
+    Downcast the time series of `n` to config["compact"]["dtype"] (float32).
+    `label` names the network in the performance report.
+    '''
+    compact = _settings(config)
+    if compact is None:
+        return
+
+    dtype = np.dtype(compact.get("dtype", "float32"))
+    before = series_memory(n)
+
+    for pnl, attr, df in list(_tables(n, compact.get("outputs", False))):
+        if (df.dtypes != dtype).any():
+            pnl[attr] = df.astype(dtype)
+
+    after = series_memory(n)
+    if label is not None:
+        logger.info(f"compact {label}: time series {round(before/1e6)} MB -> {round(after/1e6)} MB")
+        record("compact", **{label: {"before_mb": round(before / 1e6, 1), "after_mb": round(after / 1e6, 1)}})
+
+
+@contextmanager
+def full_precision(n, config):
+    '''
+    Time series of `n` as float64 while the model is built and solved, compact again afterwards
+    '''
+    compact = _settings(config)
+    if compact is None:
+        yield
+        return
+
+    for pnl, attr, df in list(_tables(n, outputs=True)):
+        if (df.dtypes != np.float64).any():
+            pnl[attr] = df.astype(np.float64)
+    try:
+        yield
+    finally:
+        compact_series(n, config)
+
+
+#########################################################################################
+# Solution differences compact vs. full precision
+def solution_difference(n, reference, rtol=1e-4):
+    '''
+    Max. absolute and relative differences between the solutions of `n` and `reference`
+    '''
+    diff = {}
+
+    if getattr(n, "objective", None) is not None and getattr(reference, "objective", None) is not None:
+        diff["objective"] = abs(n.objective - reference.objective) / max(abs(reference.objective), 1)
+
+    for list_name, attr in [("generators_t", "p"), ("links_t", "p0"), ("buses_t", "marginal_price")]:
+        a, b = getattr(n, list_name)[attr], getattr(reference, list_name)[attr]
+        if a.empty or b.empty:
+            continue
+        a, b = a.align(b, join="inner")
+        delta = (a.astype(np.float64) - b.astype(np.float64)).abs().values
+        scale = max(np.abs(b.values).max(), 1)
+        diff[f"{list_name}.{attr}"] = float(delta.max() / scale)
+
+    diff = pd.Series(diff, dtype=float)
+    logger.info(f"solution difference (relative to max): {diff.to_dict()}")
+
+    return diff, bool((diff <= rtol).all())
+
+
+def compare_results_dirs(compact_dir, reference_dir, suffix="", rtol=1e-4):
+    '''
+    Solution differences per stage of two result directories
+    '''
+    from .export import load_delta_network
+
+    rows = {}
+    for stage in ["o", "o2", "m", "n", "n_custom"]:
+        paths = [os.path.join(d, stage + suffix + ".nc") for d in [compact_dir, reference_dir]]
+        if all(os.path.exists(p) for p in paths):
+            diff, ok = solution_difference(*[load_delta_network(p) for p in paths], rtol=rtol)
+            rows[stage] = diff.to_dict() | {"within_tolerance": ok}
+
+    return pd.DataFrame(rows).T
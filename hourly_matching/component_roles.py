@@ -0,0 +1,89 @@
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Component role index
+#
+# Roles of generators and links (CI generator, CI battery charger, electrolyser, ramp up, ...)
+# are classified once per component table and cached on the network as integer positions,
+# per CI name and grid RES technologies of the config. madd/mremove replace the table index,
+# the cache holds the index object and is rebuilt on the next lookup, so it stays in sync
+# without hooks; changed generator carriers (grid_res) are detected by comparing the values.
+
+ROLES = {
+    "Generator": ["ci", "ci_res", "ci_dummy", "dummy", "ramp_up", "ramp_down", "grid_res"],
+    "Link": ["electrolyser", "ci_battery_charger", "ci_battery_discharger",
+             "battery_charger", "battery_discharger"],
+}
+
+
+def _classify(df, component, name, grid_res_techs):
+    '''
+    Boolean mask per role, one pass of string matching over the table index
+    '''
+    index = df.index
+
+    if component == "Generator":
+        ci = index.str.contains(name)
+        dummy = index.str.contains("dummy")
+        return {
+            "ci": ci,
+            "ci_res": ci & ~dummy,
+            "ci_dummy": ci & dummy,
+            "dummy": dummy,
+            "ramp_up": index.str.endswith(" ramp up"),
+            "ramp_down": index.str.endswith(" ramp down"),
+            "grid_res": df.carrier.isin(grid_res_techs).values & ~ci,
+        }
+
+    if component == "Link":
+        return {
+            "electrolyser": index.str.endswith(f"{name} H2 Electrolysis"),
+            "ci_battery_charger": index.str.contains(f"{name} battery charger"),
+            "ci_battery_discharger": index.str.contains(f"{name} battery discharger"),
+            "battery_charger": index.str.contains("battery charger"),
+            "battery_discharger": index.str.contains("battery discharger"),
+        }
+
+    raise ValueError(f"no roles defined for component {component}")
+
+
+def role_index(n, component, config=None):
+    '''
+    Dict role -> integer positions in the static table of `component`
+    '''
+    name = config['ci']['name'] if config is not None else "CI"
+    grid_res_techs = config["global"]["grid_res_techs"] if config is not None else []
+
+    df = n.df(component)
+    cache = n.__dict__.setdefault("_role_index", {})
+    key = (component, name, tuple(grid_res_techs))
+    carrier = df.carrier.values if component == "Generator" else None
+
+    if key in cache:
+        index, cached_carrier, positions = cache[key]
+        if index is df.index and (carrier is None or np.array_equal(cached_carrier, carrier)):
+            return positions
+
+    masks = _classify(df, component, name, grid_res_techs)
+    positions = {role: np.flatnonzero(mask) for role, mask in masks.items()}
+    cache[key] = (df.index, None if carrier is None else carrier.copy(), positions)
+
+    return positions
+
+
+def role_positions(n, component, role, config=None):
+    '''
+    Integer positions of the components with `role` in the static table
+    '''
+    return role_index(n, component, config)[role]
+
+
+def role_names(n, component, role, config=None):
+    '''
+    Names of the components with `role`
+    '''
+    return n.df(component).index[role_positions(n, component, role, config)]
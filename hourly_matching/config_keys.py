@@ -0,0 +1,59 @@
+import json
+import hashlib
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Keys of the model-defining config
+#
+# Results directories, the results store and model artifacts are named after the config
+# that defines the model. Sections that only decide how a run is executed, cached or
+# reported do not change the model; of config["solving"] only the options (formulation,
+# iterations) do, solver settings and warm starts do not.
+
+RUN_SECTIONS = ["logging_level", "results_dir", "network_cache", "export", "results_store", "artifacts",
+                "sensitivity", "resources", "profiling", "screening", "sampling", "run", "_overrides"]
+
+# scenario keys already in the name of the results directory (see pipeline.results_dir_for)
+NAME_KEYS = ["scenario.allocation", "scenario.operation_mode", "scenario.offtake_volume", "scenario.ely_cap"]
+
+
+def model_config(config):
+    '''
+    `config` without the sections that do not change the model
+    '''
+    content = {k: v for k, v in config.items() if k not in RUN_SECTIONS}
+    if "solving" in config:
+        content["solving"] = {"options": config["solving"].get("options")}
+    return content
+
+
+def _hash(content, length):
+
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:length]
+
+
+def config_hash(config, length=8):
+    '''
+    Short hash of the model-defining config
+    '''
+    return _hash(model_config(config), length)
+
+
+def model_overrides(config):
+    '''
+    Overrides of load_config that change the model and are not in the results directory name
+    '''
+    return {k: v for k, v in config.get("_overrides", {}).items()
+            if k not in NAME_KEYS and k.split(".")[0] not in RUN_SECTIONS
+            and (not k.startswith("solving.") or k.startswith("solving.options"))}
+
+
+def overrides_label(config, length=8):
+    '''
+    Suffix of the results directory for the model overrides, "" without
+    '''
+    overrides = model_overrides(config)
+    return "_" + _hash(overrides, length) if overrides else ""
@@ -0,0 +1,199 @@
+import os
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import xarray as xr
+import pypsa
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .aliases import resolved
+from .resources import phase
+
+
+#########################################################################################
+# Background export of results
+#
+# The netCDF dataset is assembled from the network in the calling thread (cheap, in memory),
+# compression and writing run on a single background thread while the next stage is built.
+# HDF5 is not thread-safe, hence one writer thread.
+
+_executor = None
+_pending = []
+
+
+def _writer():
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="netcdf-writer")
+    return _executor
+
+
+def export_encoding(ds, config):
+    '''
+    netCDF encoding: zlib compression, float32 time series and chunking along snapshots
+    '''
+    export_config = config.get("export", {})
+    complevel = export_config.get("compression", 0)
+    float32 = export_config.get("float32", False)
+    chunk_snapshots = export_config.get("chunk_snapshots", None)
+
+    encoding = {}
+    for name, da in ds.data_vars.items():
+        if not np.issubdtype(da.dtype, np.number):
+            continue
+        enc = {}
+        if complevel:
+            enc.update(zlib=True, complevel=complevel)
+        if "snapshots" in da.dims:
+            if float32 and da.dtype == np.float64:
+                enc["dtype"] = "float32"
+            if chunk_snapshots and da.size:
+                enc["chunksizes"] = tuple(min(chunk_snapshots, s) if d == "snapshots" else s
+                                          for d, s in zip(da.dims, da.shape))
+        if enc:
+            encoding[name] = enc
+
+    return encoding
+
+
+#########################################################################################
+# Delta storage: derived stages (m, n, n_custom) only store what differs from a parent (o2)
+
+def _changed_dims(ds, parent_ds):
+    '''
+    Dimensions whose index differs from the parent, all variables on them are stored
+    '''
+    changed = set()
+    for d in ds.dims:
+        if d not in parent_ds.dims or ds.sizes[d] != parent_ds.sizes[d]:
+            changed.add(d)
+        elif d in ds.coords and d in parent_ds.coords \
+                and not np.array_equal(ds[d].values, parent_ds[d].values):
+            changed.add(d)
+    return changed
+
+
+def delta_dataset(ds, parent_ds, parent_path, float32=False):
+    '''
+    Variables of `ds` that differ from `parent_ds`. The parent file and the parent variables
+    missing in `ds` are recorded in the attributes for load_delta_dataset().
+    Time series are compared in the dtype they are written with.
+    '''
+    changed_dims = _changed_dims(ds, parent_ds)
+
+    keep = []
+    for name, da in ds.data_vars.items():
+        if name not in parent_ds.data_vars or changed_dims.intersection(da.dims):
+            keep.append(name)
+            continue
+        if float32 and "snapshots" in da.dims and da.dtype == np.float64:
+            da = da.astype("float32")
+        if not da.equals(parent_ds[name]):
+            keep.append(name)
+
+    removed = [name for name in parent_ds.data_vars if name not in ds.data_vars]
+
+    delta = ds[keep]
+    delta.attrs = dict(ds.attrs)
+    delta.attrs["delta_parent"] = parent_path
+    delta.attrs["delta_removed"] = ",".join(removed)
+
+    logger.info(f"delta export: {len(keep)} of {len(ds.data_vars)} variables differ from {parent_path}")
+
+    return delta
+
+
+def load_delta_dataset(path):
+    '''
+    Full network dataset of `path`, resolving delta files against their parents (recursively).
+    Every file is read into memory and closed.
+    '''
+    with xr.open_dataset(path) as f:
+        ds = f.load()
+
+    parent = ds.attrs.get("delta_parent", None)
+    if parent is None:
+        return ds
+
+    parent_ds = load_delta_dataset(os.path.join(os.path.dirname(path), parent))
+
+    removed = [r for r in ds.attrs["delta_removed"].split(",") if r]
+    # the variables stored in the delta replace the parent's
+    base = parent_ds.drop_vars(removed + [v for v in ds.data_vars if v in parent_ds.data_vars])
+    base = base.drop_dims([d for d in _changed_dims(ds, base) if d in base.dims and d in ds.dims])
+
+    full = xr.merge([base, ds], compat="override", join="outer")
+    full.attrs = {k: v for k, v in ds.attrs.items() if k not in ["delta_parent", "delta_removed"]}
+
+    return full
+
+
+def load_delta_network(path):
+    '''
+    Import a network exported with delta storage (or a plain netCDF)
+    '''
+    n = pypsa.Network()
+    n.import_from_netcdf(load_delta_dataset(path))
+    return n
+
+
+#########################################################################################
+def _write(ds, path, encoding, parent=None, float32=False):
+
+    if parent is not None:
+        with xr.open_dataset(parent) as parent_ds:
+            parent_path = os.path.relpath(parent, os.path.dirname(path) or ".")
+            ds = delta_dataset(ds, parent_ds, parent_path, float32)
+            encoding = {k: v for k, v in encoding.items() if k in ds.data_vars}
+            ds.to_netcdf(path, encoding=encoding)
+    else:
+        ds.to_netcdf(path, encoding=encoding)
+
+    logger.info(f"exported {path}")
+
+
+def write_dataset(ds, path, config, parent=None):
+    '''
+    Write a network dataset to `path`, in the background if config["export"]["asynchronous"].
+    With config["export"]["delta"], only the differences to the `parent` netCDF are stored.
+    '''
+    export_config = config.get("export", {})
+    encoding = export_encoding(ds, config)
+
+    if not export_config.get("delta", False):
+        parent = None
+    args = (ds, path, encoding, parent, export_config.get("float32", False))
+
+    if not export_config.get("asynchronous", False):
+        _write(*args)
+        return
+
+    # exports are written in order, so the parent file is complete when its delta is computed
+    _pending.append(_writer().submit(_write, *args))
+
+
+def export_network(n, path, config, parent=None):
+    '''
+    Export network `n` to netCDF, replaces n.export_to_netcdf(path).
+    `parent` is the netCDF of the stage `n` was copied from, used for delta storage.
+    '''
+    # aliased series (see aliases.py) are written out, the file is self-contained
+    with phase("export"):
+        with resolved(n):
+            ds = n.export_to_netcdf()
+        write_dataset(ds, path, config, parent)
+
+
+def wait_for_exports():
+    '''
+    Barrier: block until all queued exports are written, raise the first failed export
+    '''
+    while _pending:
+        _pending.pop(0).result()
+
+
+atexit.register(wait_for_exports)
@@ -0,0 +1,88 @@
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Snapshot window for smoke tests
+def horizon_snapshots(n, config):
+    '''
+    Snapshots of the configured window: every `stride`-th of `length` snapshots from `start`
+    '''
+    horizon = config.get("horizon", {})
+
+    start = horizon.get("start", 0)
+    length = horizon.get("length", None)
+    stride = horizon.get("stride", 1)
+    stop = None if length is None else start + length
+
+    return n.snapshots[start:stop:stride]
+
+
+def aggregate_snapshots(n, snapshots, hours):
+    '''
+    Replace every `hours` consecutive `snapshots` of `n` by one snapshot with the weighted mean
+    of the time series and the summed weightings. Averaging a solution of the full problem
+    gives a solution of the aggregated one (the constraints are linear in the series and the
+    storage balance sees the summed dispatch), so the aggregated problem is a relaxation.
+    '''
+    block = np.arange(len(snapshots)) // hours
+    weights = n.snapshot_weightings.loc[snapshots]
+    w = weights.generators.values
+    w_block = np.bincount(block, weights=w)
+
+    means = {}
+    for c in n.iterate_components():
+        for attr, df in c.pnl.items():
+            if not df.empty and all(np.issubdtype(t, np.number) for t in df.dtypes):
+                means[(c.list_name, attr)] = (df.loc[snapshots].mul(w, axis=0).groupby(block).sum()
+                                              .div(w_block, axis=0))
+
+    first = snapshots[::hours]
+    n.set_snapshots(list(first))
+    n.snapshot_weightings.loc[:, :] = weights.groupby(block).sum().values
+    for (list_name, attr), df in means.items():
+        getattr(n, list_name + "_t")[attr] = df.set_axis(first, axis=0)
+
+
+def set_horizon(n, config):
+    '''
+    Restrict `n` to the snapshot window of config["horizon"].
+    Weightings are multiplied by the stride, so weighted sums (RES target, hourly matching,
+    electrolysis demand) cover the window. Annualised capital costs are scaled to the
+    share of the year the window represents, so the expansion stays comparable.
+    With `aggregate`, every `stride` snapshots are averaged instead (aggregate_snapshots).
+    All later stages are copies of `n` and inherit the window.
+    '''
+    horizon = config.get("horizon", {})
+
+    if not horizon.get("enabled", False):
+        return
+
+    stride = horizon.get("stride", 1)
+    total_weight = n.snapshot_weightings.generators.sum()
+
+    if horizon.get("aggregate", False):
+        start, length = horizon.get("start", 0), horizon.get("length", None)
+        aggregate_snapshots(n, n.snapshots[start:None if length is None else start + length], stride)
+    else:
+        n.set_snapshots(list(horizon_snapshots(n, config)))
+        n.snapshot_weightings.loc[:, :] = n.snapshot_weightings.values * stride
+
+    share = n.snapshot_weightings.generators.sum() / total_weight
+
+    logger.info(f"horizon: {len(n.snapshots)} snapshots, {'blocks' if horizon.get('aggregate', False) else 'stride'} {stride}, "
+                f"{round(share*100, 2)} % of the year")
+
+    if horizon.get("scale_capital_costs", True):
+        for c in n.iterate_components(["Generator", "StorageUnit", "Store", "Link", "Line"]):
+            c.df["capital_cost"] *= share
+
+
+def horizon_share(n, full_hours=8760):
+    '''
+    Share of the year covered by the snapshots of `n`
+    '''
+    return n.snapshot_weightings.generators.sum() / full_hours
@@ -0,0 +1,289 @@
+import os
+import sys
+import uuid
+import pickle
+import hashlib
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import pandas as pd
+import pypsa
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Binary cache of parsed input networks
+#
+# cache/<file stem>-<path hash>/
+#     meta.pkl              source path, size, mtime (and sha256) of the netCDF, pypsa version
+#     network.pkl           pickled network (time series moved out if mmap is used)
+#     series/<c>-<attr>.npy large time series tables, memory-mapped on load
+#
+# For parallel scenario workers the parent can instead place the large tables of a loaded
+# network in shared memory (see share_network), workers attach to them read-only.
+
+
+def file_checksum(path, chunk_size=2**24):
+    '''
+    sha256 of a file, read in chunks to keep memory flat
+    '''
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_dir_for(path, config):
+    '''
+    One cache directory per input file
+    '''
+    cache_config = config.get("network_cache", {})
+    stem = os.path.splitext(os.path.basename(path))[0]
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    return os.path.join(cache_config.get("dir", "cache/"), f"{stem}-{key}")
+
+
+def _source_meta(path, validate="stat"):
+    '''
+    Source file and pypsa version of a cache, the sha256 only if it is validated by checksum
+    '''
+    stat = os.stat(path)
+    return {
+        "source": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": file_checksum(path) if validate == "checksum" else None,
+        "pypsa": pypsa.__version__,
+    }
+
+
+def _is_valid(path, cache_dir, validate):
+    '''
+    "stat" compares size and mtime of the input file, "checksum" rehashes it.
+    A cache pickled by another pypsa version is rebuilt. A meta file that is missing or
+    being replaced by another process (see write_network_cache) makes the cache invalid.
+    '''
+    if not os.path.exists(os.path.join(cache_dir, "network.pkl")):
+        return False
+
+    try:
+        with open(os.path.join(cache_dir, "meta.pkl"), "rb") as f:
+            meta = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return False
+
+    stat = os.stat(path)
+    if meta.get("pypsa") != pypsa.__version__ or meta["size"] != stat.st_size:
+        return False
+    if validate == "checksum":
+        return meta.get("sha256") == file_checksum(path)
+    return meta["mtime"] == stat.st_mtime
+
+
+def _replace(path, write):
+    '''
+    Write `path` through a temporary file in the same directory (write(f) on the open file),
+    so concurrent readers see the old or the new file, never a partial one
+    '''
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _large_series(n, min_size):
+    '''
+    Float time series tables worth memory-mapping
+    '''
+    for c in n.iterate_components():
+        for attr, df in c.pnl.items():
+            if df.size >= min_size and (df.dtypes == np.float64).all():
+                yield c.list_name, attr, df
+
+
+def _dumps_without(n, moved):
+    '''
+    Pickle `n` without the time series tables in `moved`, restore them afterwards
+    '''
+    try:
+        for list_name, attr, df in moved:
+            getattr(n, list_name + "_t")[attr] = df.iloc[:, :0]
+        series_columns = {(list_name, attr): df.columns for list_name, attr, df in moved}
+        return pickle.dumps((n, series_columns), protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for list_name, attr, df in moved:
+            getattr(n, list_name + "_t")[attr] = df
+
+
+def write_network_cache(n, path, config):
+    '''
+    Store the parsed network `n` of input file `path` in the cache
+    '''
+    cache_config = config.get("network_cache", {})
+    cache_dir = cache_dir_for(path, config)
+    series_dir = os.path.join(cache_dir, "series")
+    os.makedirs(series_dir, exist_ok=True)
+
+    meta_file = os.path.join(cache_dir, "meta.pkl")
+    try:
+        os.remove(meta_file)
+    except FileNotFoundError:
+        pass
+
+    logger.info(f"write network cache {cache_dir}")
+
+    moved = []
+    if cache_config.get("mmap", False):
+        min_size = cache_config.get("mmap_min_size", 1e6)
+        for list_name, attr, df in list(_large_series(n, min_size)):
+            _replace(os.path.join(series_dir, f"{list_name}-{attr}.npy"),
+                     lambda f: np.save(f, np.ascontiguousarray(df.values)))
+            moved.append((list_name, attr, df))
+
+    network = _dumps_without(n, moved)
+    _replace(os.path.join(cache_dir, "network.pkl"), lambda f: f.write(network))
+
+    # meta last, so an interrupted write leaves an invalid cache
+    meta = _source_meta(path, cache_config.get("validate", "stat"))
+    _replace(meta_file, lambda f: pickle.dump(meta, f))
+
+
+def read_network_cache(path, config):
+    '''
+    Load the cached network of input file `path`.
+    Memory-mapped tables are opened copy-on-write, so the network can be modified.
+    '''
+    cache_dir = cache_dir_for(path, config)
+
+    with open(os.path.join(cache_dir, "network.pkl"), "rb") as f:
+        n, series_columns = pickle.load(f)
+
+    for (list_name, attr), columns in series_columns.items():
+        values = np.load(os.path.join(cache_dir, "series", f"{list_name}-{attr}.npy"), mmap_mode="c")
+        getattr(n, list_name + "_t")[attr] = pd.DataFrame(values, index=n.snapshots,
+                                                          columns=columns, copy=False)
+    return n
+
+
+def load_network(path, config):
+    '''
+    Import network from netCDF file `path`, going through the binary cache if enabled
+    '''
+    cache_config = config.get("network_cache", {})
+
+    if path in _shared_specs:
+        logger.info(f"attach network {path} from shared memory")
+        return attach_network(_shared_specs[path])
+
+    if not cache_config.get("enabled", False):
+        return pypsa.Network(path)
+
+    cache_dir = cache_dir_for(path, config)
+    validate = cache_config.get("validate", "stat")
+
+    if _is_valid(path, cache_dir, validate):
+        logger.info(f"load network from cache {cache_dir}")
+        try:
+            return read_network_cache(path, config)
+        except Exception as e:
+            logger.warning(f"network cache {cache_dir} unreadable ({e}), rebuilding")
+
+    n = pypsa.Network(path)
+    write_network_cache(n, path, config)
+
+    return n
+
+
+#########################################################################################
+# Shared-memory input network for parallel workers
+#
+# The parent loads the input network once and copies its large float time series into
+# shared memory blocks. Workers unpickle the small rest of the network and wrap the blocks
+# as read-only arrays without copying. Tables a worker changes are replaced by new frames
+# (adding the CI generators to p_max_pu, set_horizon, n.copy()), so only those are
+# materialised in the worker; in-place writes into a shared table raise an error.
+# Only the parent owns the blocks: workers attach without registering them with the
+# resource tracker, which would otherwise unlink them when the first worker exits.
+
+_shared_specs = {}
+_attached = []
+
+
+def share_network(n, config):
+    '''
+    Place the large time series of `n` in shared memory.
+    Returns the spec passed to workers and the blocks to release with release_network.
+    '''
+    min_size = config.get("network_cache", {}).get("shared_min_size", 1e6)
+
+    blocks, series = [], []
+    for list_name, attr, df in list(_large_series(n, min_size)):
+        values = np.ascontiguousarray(df.values)
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+        blocks.append(shm)
+        series.append((list_name, attr, shm.name, values.shape, values.dtype.str))
+
+    moved = [(list_name, attr, getattr(n, list_name + "_t")[attr]) for list_name, attr, *_ in series]
+
+    logger.info(f"shared {len(series)} time series tables, "
+                f"{round(sum(b.size for b in blocks) / 1e9, 2)} GB")
+
+    return {"network": _dumps_without(n, moved), "series": series}, blocks
+
+
+def release_network(blocks):
+    '''
+    Free the shared memory blocks of share_network (parent, after all workers finished)
+    '''
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def _attach(name):
+    '''
+    Attach to the shared memory block `name` without taking ownership
+    '''
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # before 3.13 attaching registers the block. Unregistering afterwards is no option: spawned
+    # workers share the tracker of the parent and would drop its registration, so skip it.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach_network(spec):
+    '''
+    Network of a share_network spec, large time series as read-only views of shared memory
+    '''
+    n, series_columns = pickle.loads(spec["network"])
+
+    for list_name, attr, name, shape, dtype in spec["series"]:
+        shm = _attach(name)
+        _attached.append(shm)  # keep the mapping open while the worker lives
+        values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        values.flags.writeable = False
+        getattr(n, list_name + "_t")[attr] = pd.DataFrame(values, index=n.snapshots,
+                                                          columns=series_columns[(list_name, attr)],
+                                                          copy=False)
+    return n
+
+
+def use_shared_network(path, spec):
+    '''
+    Worker initializer: load_network(path) attaches to the shared network of `spec`
+    '''
+    _shared_specs[path] = spec
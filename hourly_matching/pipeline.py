@@ -0,0 +1,503 @@
+import os
+
+import yaml
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .solve_together import shutdown_lineexp, set_co2_price, prepare_elys, add_H2_demand, add_elys, add_CI_gen_bat, add_dummies
+from .additional_constraints import add_battery_constraints, country_res_constraints, excess_constraints
+from .ED_CM import drop_empty_components, build_market_model, prepare_congestion_management
+from .network_cache import load_network
+from .horizon import set_horizon
+from .reduction import reduce_network, reduce_elys, reduction_label, write_busmap, ac_busmap_of
+from .config_keys import model_overrides, overrides_label
+from .export import export_network, load_delta_network, wait_for_exports
+from .results_store import write_run_to_store
+from .postprocessing import ramp_volume, ramp_down_prices
+from .component_roles import role_names
+from .solving import optimize, write_performance_report, reset_report
+from .compact import compact_series
+from .resources import phase, start_sampler, stop_sampler
+from .profiling import profiled
+
+
+#########################################################################################
+# Pipeline stages o -> o2 -> (o2_temp) -> m, n, n_custom
+#
+# Every stage is a function of the run context (config, mode, results directory, networks
+# solved or loaded so far). Stages pull their predecessors lazily, from memory or, when
+# resuming, from the exported netCDF files of an earlier run.
+
+MODES = {
+    # scenario with CI: hourly matching, electrolysers, H2 store
+    "scenario": {"stages": ["o", "o2", "m", "n", "n_custom"], "suffix": "", "ci": True,
+                 "link_tolerance": 0.000001, "fix_stores_links": True, "release_su_fix": True},
+    # 2030 reference without CI
+    "ref": {"stages": ["o", "o2", "m", "n", "n_custom"], "suffix": "-r", "ci": False,
+            "link_tolerance": 0.001, "fix_stores_links": True, "release_su_fix": True},
+    # 2019 validation, dispatch of the 2019 network only
+    "2019": {"stages": ["o2", "m", "n", "n_custom"], "suffix": "-19", "ci": False,
+             "link_tolerance": None, "fix_stores_links": False, "release_su_fix": False},
+}
+
+
+def set_value(config, key, value):
+    '''
+    Set a nested config entry from a dotted key, e.g. "scenario.ely_cap"
+    '''
+    *path, last = key.split(".")
+    d = config
+    for k in path:
+        d = d.setdefault(k, {})
+    d[last] = value
+
+
+def load_config(path="config.yaml", overrides=None):
+    '''
+    Read config.yaml and apply `overrides` ({dotted key: value}). The overrides are kept in
+    config["_overrides"] for the name of the results directory.
+    '''
+    with open(path, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    for key, value in (overrides or {}).items():
+        set_value(config, key, value)
+    config["_overrides"] = dict(overrides or {})
+
+    return config
+
+
+def results_dir_for(config, mode):
+    '''
+    <results_dir>/<scenario name>[_<buses>b...][_<hash of the other model overrides>]/, sweep
+    points that differ in keys outside the scenario name (excess, res_share, ...) get their own
+    '''
+    if mode == "ref":
+        name = "2030_ref"
+    elif mode == "2019":
+        name = "2019"
+    else:
+        s = config['scenario']
+        name = s['allocation'] + "_" + s['operation_mode'] + "_" + str(s['offtake_volume']) \
+                + "_" + str(s['ely_cap']/1000) + "GW"
+
+    return os.path.join(config.get("results_dir", "results"),
+                        name + reduction_label(config) + overrides_label(config)) + "/"
+
+
+def context(config, mode="scenario", results_dir=None):
+    '''
+    Run context of `mode` (scenario, ref, 2019)
+    '''
+    settings = MODES[mode]
+    ctx = {"config": config, "mode": mode, **settings,
+           "results_dir": results_dir_for(config, mode) if results_dir is None else results_dir,
+           "solving": config["s2019"]["solving"] if mode == "2019" else None,
+           "h2buses_df": None, "networks": {}}
+
+    if settings["ci"]:
+        # read electrolyser location and capacity file
+        elys_file = config['elys_path'] + config['scenario']['allocation'] + "_" + config['scenario']['operation_mode'] \
+                    + "_elys_" + str(config['scenario']['buses']) + ".csv"
+        ctx["h2buses_df"] = prepare_elys(pd.read_csv(elys_file, delimiter=";"), config)
+
+    os.makedirs(ctx["results_dir"], exist_ok=True)
+
+    # the overrides behind the hash in the directory name
+    overrides = model_overrides(config)
+    if overrides:
+        with open(ctx["results_dir"] + "overrides.yaml", "w") as f:
+            yaml.safe_dump(overrides, f, sort_keys=True)
+
+    return ctx
+
+
+def stage_path(ctx, stage):
+
+    return ctx["results_dir"] + stage + ctx["suffix"] + ".nc"
+
+
+def network(ctx, stage, resume=True):
+    '''
+    Network of `stage`: already in the context, loaded from its result file (resume) or solved
+    '''
+    networks = ctx["networks"]
+    if stage not in networks:
+        path = stage_path(ctx, stage)
+        if resume and os.path.exists(path):
+            logger.info(f"Load {stage} from {path}")
+            with phase("load", stage + ctx["suffix"]):
+                networks[stage] = load_delta_network(path)
+        else:
+            with phase("prepare", stage + ctx["suffix"]), \
+                    profiled(ctx["config"], stage + ctx["suffix"], ctx["results_dir"]):
+                networks[stage] = STAGES[stage](ctx)
+
+    return networks[stage]
+
+
+def print_summary(n, title, lines=()):
+
+    print(n.model.constraints)
+    print("\n#################\n")
+    print(title)
+    print("Number of variables: ",n.model.nvars)
+    print("Number of constraints: ",n.model.ncons)
+    for label, value in lines:
+        print(label, value)
+    print("\n#################\n")
+
+
+#########################################################################################
+# Custom constraints per stage
+def soc_constraints(n, margin):
+
+    sus = n.model.variables["StorageUnit-state_of_charge"]
+    min_soc = n.storage_units.max_hours * n.storage_units.p_nom * margin
+    max_soc = n.storage_units.max_hours * n.storage_units.p_nom * (1 - margin)
+    n.model.add_constraints(sus >= min_soc, name="StorageUnit-minimum_soc")
+    n.model.add_constraints(sus <= max_soc, name="StorageUnit-maximum_soc")
+
+
+def release_storage_unit_fix(n):
+
+    n.model.constraints.remove("StorageUnit-fix-p_dispatch-lower")
+    n.model.constraints.remove("StorageUnit-fix-p_dispatch-upper")
+    n.model.constraints.remove("StorageUnit-fix-p_store-lower")
+    n.model.constraints.remove("StorageUnit-fix-p_store-upper")
+
+
+def custom_objective(n, m, config):
+    '''
+    CM costs: ramp up at its marginal cost, ramp down at the zone price of `m` minus its marginal cost
+    '''
+    weights = n.snapshot_weightings["generators"].values[:, None]
+
+    up = role_names(n, "Generator", "ramp_up")
+    down = role_names(n, "Generator", "ramp_down")
+
+    # price of the bidding zone of every ramp down generator in the market model
+    price = ramp_down_prices(m, n, down)
+    mc_up = n.generators.marginal_cost[up].values[None, :]
+    mc_down = n.generators.marginal_cost[down].values[None, :]
+
+    p = n.model['Generator-p']
+    obj_fct = (p.loc[:, up] * pd.DataFrame(weights * mc_up, index=n.snapshots, columns=up)).sum() \
+        + (p.loc[:, down] * pd.DataFrame(weights * -1 * (price - mc_down), index=n.snapshots, columns=down)).sum()
+
+    n.model.add_objective(obj_fct, overwrite=True)
+
+
+def solve_stage(ctx, n, stage, soc_margin=None, battery_res=False, release_su_fix=False, objective_of=None):
+    '''
+    Solve `n` as `stage` with the custom constraints of the run mode
+    '''
+    config = ctx["config"]
+
+    def extra_functionality(n, snapshots):
+
+        if release_su_fix:
+            release_storage_unit_fix(n)
+
+        if battery_res:
+            add_battery_constraints(n)
+            country_res_constraints(n, config)
+
+        if ctx["ci"]:
+            excess_constraints(n, ctx["h2buses_df"], config)
+
+        if soc_margin is not None:
+            soc_constraints(n, soc_margin)
+
+        if objective_of is not None:
+            custom_objective(n, objective_of, config)
+
+    return optimize(n, config, extra_functionality, solving=ctx["solving"], stage=stage + ctx["suffix"],
+             results_dir=ctx["results_dir"])
+
+
+#########################################################################################
+# Stages
+def prepare_system(ctx):
+    '''
+    2030 power system with CI generators, batteries and electrolysers (scenario mode)
+    '''
+    config = ctx["config"]
+
+    # import network (or the combined weather years, see years.py) --------------
+    o = ctx.get("input_network")
+    if o is None:
+        o = load_network(config['network_file'], config)
+
+    # cluster to config["reduction"]["buses"] for screening runs, electrolysers follow
+    o, busmap = reduce_network(o, config)
+    ctx["h2buses_df"] = reduce_elys(ctx["h2buses_df"], busmap)
+    if busmap is not None:
+        write_busmap(busmap, ctx["results_dir"])
+
+    # network pre-modifications ----------------------------------
+
+    # add missing carrier and colors
+    bat_color = o.carriers.color.loc["battery"]
+    o.madd(
+            "Carrier",
+            ["H2 electrolysis", "H2 fuel cell", "battery charger", "battery discharger"],
+            color=["#ff29d9", "#c251ae", bat_color, bat_color]
+        )
+
+    # Add mc to storage links to avoid USC ----------------------------------
+    o.links.loc[o.links.carrier != "DC", "marginal_cost"] = config["global"]["mc_usc"]
+
+    # Set network up ------------------------------------------------
+    shutdown_lineexp(o)
+    set_co2_price(o, config)
+
+    if ctx["ci"]:
+        add_H2_demand(o, config)
+        add_CI_gen_bat(o, config)
+        add_elys(o, ctx["h2buses_df"], config)
+
+    if config["global"]["dummies"]:
+        add_dummies(o, config)
+
+    # Oversize stores 2 %
+    o.stores.e_min_pu = 0.01
+    o.stores.e_max_pu = 0.99
+
+    # Remove sus with max_hours=0
+    o.mremove(
+        "StorageUnit",
+        o.storage_units[o.storage_units["max_hours"]==0].index
+    )
+
+    # Restrict to snapshot window (after all components with capital costs are added)
+    set_horizon(o, config)
+
+    compact_series(o, config, "o")
+
+    return o
+
+
+def stage_o(ctx):
+    '''
+    Build 2030 power system (capacity expansion)
+    '''
+    o = prepare_system(ctx)
+
+    logger.info("Solve o")
+    solve_stage(ctx, o, "o", soc_margin=0.01, battery_res=True)
+
+    print_summary(o, "Power system 2030 - o" + ctx["suffix"] + ".nc",
+                  [("Objective value o (Investment + Dispatch): ", o.objective / 1e6)])
+
+    # Fixing optimal capcities
+    o.optimize.fix_optimal_capacities()
+    export_network(o, stage_path(ctx, "o"), ctx["config"])
+
+    return o
+
+
+def stage_o2(ctx):
+    '''
+    Nodal dispatch with the capacities of o (or of the 2019 network)
+    '''
+    config = ctx["config"]
+
+    if ctx["mode"] == "2019":
+        o2 = load_network(config["s2019"]['network_file'], config)
+        if config.get("reduction", {}).get("enabled", False):
+            # same clusters as the 2030 runs: AC busmap of the 2030 input network
+            ac_busmap = ac_busmap_of(load_network(config['network_file'], config), config)
+            o2, busmap = reduce_network(o2, config, ac_busmap)
+            write_busmap(busmap, ctx["results_dir"])
+        o2.mremove(
+            "StorageUnit",
+            o2.storage_units[o2.storage_units["max_hours"]==0].index
+        )
+        set_horizon(o2, config)
+        compact_series(o2, config, "o2")
+        title = "Power system 2019 (dispatch) - o2"
+    else:
+        o2 = network(ctx, "o").copy()
+        drop_empty_components(o2)
+        title = "Power system 2030 dispatch only - o2"
+
+    logger.info("Solve o2")
+    solve_stage(ctx, o2, "o2", soc_margin=0.001)
+
+    export_network(o2, stage_path(ctx, "o2"), config)
+
+    print_summary(o2, title + ctx["suffix"] + ".nc", [("Objective value o2 (Nodal Dispatch): ", o2.objective / 1e6)])
+
+    return o2
+
+
+def fixed_dispatch(ctx):
+    '''
+    o2 with fixed storage dispatch, the template of the ED and CM stages
+    '''
+    if "o2_temp" in ctx:
+        return ctx["o2_temp"]
+
+    o2 = network(ctx, "o2")
+    o2_temp = o2.copy()
+
+    # Fix variables
+    storage_units_soc_initial = o2.storage_units_t.state_of_charge.iloc[-1,:]
+        # storage_units
+    o2_temp.storage_units["state_of_charge_initial"] = storage_units_soc_initial
+    o2_temp.storage_units.cyclic_state_of_charge = False
+    o2_temp.storage_units_t.p_dispatch_set = o2.storage_units_t.p_dispatch
+    o2_temp.storage_units_t.p_store_set = o2.storage_units_t.p_store
+
+    if ctx["fix_stores_links"]:
+        # Free up oversized space
+        o2_temp.stores.e_min_pu = 0.0
+        o2_temp.stores.e_max_pu = 1.0
+
+            # stores and links: without CI H2 and bat
+        o2_temp.stores.e_cyclic = False
+        o2_temp.stores.e_initial = o2.stores_t.e.iloc[-1,:]
+
+        tol = ctx["link_tolerance"]
+        p0_links_pu = o2_temp.links_t.p0 / o2_temp.links.p_nom
+        o2_temp.links_t.p_min_pu = p0_links_pu - tol
+        o2_temp.links_t.p_max_pu = p0_links_pu + tol
+
+        # (not in a reduced network if the link became internal to a cluster)
+        o2_temp.links_t.p_min_pu.drop(columns=["T10","T18","T20"], inplace=True, errors="ignore")
+        o2_temp.links_t.p_max_pu.drop(columns=["T10","T18","T20"], inplace=True, errors="ignore")
+
+    compact_series(o2_temp, ctx["config"], "o2_temp")
+
+    ctx["o2_temp"] = o2_temp
+    return o2_temp
+
+
+def market_zones(n, config):
+    '''
+    Bidding zones of config["market"]: None (single zone BZ), "country" or {zone: [buses]},
+    and the exchange capacities [[zone0, zone1, MW], ...] (None: from the grid)
+    '''
+    market = config.get("market", {})
+    setting = market.get("zones")
+
+    if setting is None:
+        zones = None
+    elif setting == "country":
+        zones = n.buses.country[n.buses.carrier.isin(["AC", "DC"])]
+    else:
+        zones = pd.Series({bus: zone for zone, buses in setting.items() for bus in buses})
+
+    capacity = market.get("exchange_capacity")
+    if capacity is not None:
+        capacity = {(a, b): float(c) for a, b, c in capacity}
+
+    return zones, capacity
+
+
+def stage_m(ctx):
+    '''
+    Economic dispatch, single zone (or the zones of config["market"])
+    '''
+    o2_temp = fixed_dispatch(ctx)
+    m = build_market_model(o2_temp, *market_zones(o2_temp, ctx["config"]))  # for market model
+
+    logger.info("Solve m")
+    solve_stage(ctx, m, "m", release_su_fix=ctx["release_su_fix"])
+
+    export_network(m, stage_path(ctx, "m"), ctx["config"], parent=stage_path(ctx, "o2"))
+
+    print_summary(m, "ED - m" + ctx["suffix"] + ".nc", [("Objective value m: ", m.objective / 1e6)])
+
+    return m
+
+
+def stage_n(ctx):
+    '''
+    Congestion management with ramp up/down generators
+    '''
+    m = network(ctx, "m")
+    n = fixed_dispatch(ctx).copy()  # for redispatch model
+    prepare_congestion_management(m, n)
+
+    logger.info("Solve n")
+    solve_stage(ctx, n, "n", release_su_fix=ctx["release_su_fix"])
+
+    export_network(n, stage_path(ctx, "n"), ctx["config"], parent=stage_path(ctx, "o2"))
+
+    print_summary(n, "CM - n" + ctx["suffix"] + ".nc",
+                  [("Objective value n (should be same as o2): ", n.objective / 1e6),
+                   ("n-m (CM costs in Mio): ", (n.objective - m.objective) / 1e6),
+                   ("ramp up [TWh]: ", ramp_volume(n, "ramp up") / 1e6),
+                   ("ramp down [TWh]: ", ramp_volume(n, "ramp down") / 1e6)])
+
+    return n
+
+
+def stage_n_custom(ctx):
+    '''
+    Congestion management, objective: CM costs priced with the ED price of m
+    '''
+    m = network(ctx, "m")
+    n_custom = fixed_dispatch(ctx).copy()  # for redispatch model
+    prepare_congestion_management(m, n_custom)
+
+    logger.info("Solve n_custom")
+    solve_stage(ctx, n_custom, "n_custom", release_su_fix=ctx["release_su_fix"], objective_of=m)
+
+    export_network(n_custom, stage_path(ctx, "n_custom"), ctx["config"], parent=stage_path(ctx, "o2"))
+
+    print_summary(n_custom, "CM CUSTOM - n_custom" + ctx["suffix"] + ".nc",
+                  [("objective value (CM costs in Mio): ", n_custom.objective / 1e6),
+                   ("ramp up [TWh]: ", ramp_volume(n_custom, "ramp up") / 1e6),
+                   ("ramp down [TWh]: ", ramp_volume(n_custom, "ramp down") / 1e6)])
+
+    return n_custom
+
+
+STAGES = {"o": stage_o, "o2": stage_o2, "m": stage_m, "n": stage_n, "n_custom": stage_n_custom}
+
+
+#########################################################################################
+def run(config, mode="scenario", resume=False, until=None, only=None):
+    '''
+    Run the stages of `mode` up to `until` (all by default), or only the stage `only` with its
+    predecessors loaded from the results directory. With `resume`, stages with a result file
+    are loaded instead of solved.
+    '''
+    ctx = context(config, mode)
+    order = ctx["stages"]
+
+    if only is not None:
+        targets = [only]
+    else:
+        targets = order[:order.index(until) + 1] if until is not None else order
+
+    reset_report()
+    # RSS, CPU and threads per stage and phase (config["resources"])
+    sampler = start_sampler(config)
+
+    try:
+        for stage in targets:
+            network(ctx, stage, resume=(resume or only is not None) and stage != only)
+
+        networks = ctx["networks"]
+
+        # KPIs and key series into the cross-scenario results store
+        if all(stage in networks for stage in order):
+            with phase("store"):
+                write_run_to_store({s: networks[s] for s in order}, config, run=mode)
+
+        # all result files complete before exit
+        with phase("export"):
+            wait_for_exports()
+    finally:
+        stop_sampler(sampler, ctx["results_dir"])
+
+    # solver, build and solve times (and resource peaks) of every stage
+    write_performance_report(ctx["results_dir"] + "performance.yaml")
+
+    return networks
@@ -0,0 +1,276 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .component_roles import role_names
+
+
+#########################################################################################
+# KPI post-processing of solved stages
+#
+# All KPIs are computed on the raw arrays of the *_t tables with column positions (from the
+# component role index) and group codes built once per network, no groupby.
+# Long format: stage, kpi, group, value (group "" is the total).
+
+
+def _codes(values):
+
+    codes, labels = pd.factorize(values)
+    return codes, labels
+
+
+def _columns(cols, names):
+    '''
+    Positions of `names` among the columns of a time series table
+    '''
+    pos = cols.get_indexer(names)
+    return pos[pos >= 0]
+
+
+def generator_index(n, config=None):
+    '''
+    Column positions in n.generators_t.p and carrier/bus codes of its columns
+    '''
+    cols = n.generators_t.p.columns
+    gens = n.generators.reindex(cols)
+
+    return {
+        "up": _columns(cols, role_names(n, "Generator", "ramp_up", config)),
+        "down": _columns(cols, role_names(n, "Generator", "ramp_down", config)),
+        "ci": _columns(cols, role_names(n, "Generator", "ci_res", config)),
+        "carrier": _codes(gens.carrier.values),
+        "bus": _codes(gens.bus.values),
+        "marginal_cost": gens.marginal_cost.values,
+    }
+
+
+def link_index(n, config=None):
+    '''
+    Column positions in n.links_t.p0 of electrolysers and CI battery inverters
+    '''
+    cols = n.links_t.p0.columns
+    return {
+        "ely": _columns(cols, role_names(n, "Link", "electrolyser", config)),
+        "dis": _columns(cols, role_names(n, "Link", "ci_battery_discharger", config)),
+        "ch": _columns(cols, role_names(n, "Link", "ci_battery_charger", config)),
+        "efficiency": n.links.efficiency.reindex(cols).values,
+        "p_nom": n.links.p_nom.reindex(cols).values,
+    }
+
+
+def _grouped(values, codes):
+
+    codes, labels = codes
+    return pd.Series(np.bincount(codes, weights=values, minlength=len(labels)), index=labels)
+
+
+def _rows(stage, kpi, series):
+
+    rows = [(stage, kpi, str(group), value) for group, value in series.items()]
+    rows.append((stage, kpi, "", series.sum()))
+    return rows
+
+
+def ramp_down_prices(m, n, down, snapshots=None):
+    '''
+    Market price of m (snapshots x `down`) in the bidding zone of each ramp down generator of `n`
+    '''
+    zone = m.generators.bus.reindex(pd.Index(down).str.removesuffix(" ramp down")).values
+    snapshots = n.snapshots if snapshots is None else snapshots
+    return m.buses_t.marginal_price.reindex(index=snapshots, columns=zone).values
+
+
+def redispatch_kpis(n, stage, price=None, gi=None):
+    '''
+    Redispatch volume [MWh] and cost [EUR] of the ramp generators by carrier, bus and month.
+    `price` (snapshots x ramp down generators, see ramp_down_prices) is the market price of m
+    for the custom objective of n_custom, where ramping down is valued at price minus
+    marginal cost.
+    '''
+    gi = generator_index(n) if gi is None else gi
+
+    p = n.generators_t.p.values
+    w = n.snapshot_weightings.generators.reindex(n.generators_t.p.index).values
+    month = _codes(n.generators_t.p.index.month.values) \
+        if isinstance(n.generators_t.p.index, pd.DatetimeIndex) else None
+
+    rows = []
+    for direction in ["up", "down"]:
+        pos = gi[direction]
+        pw = p[:, pos] * w[:, None]
+        mc = gi["marginal_cost"][pos]
+
+        energy = pw.sum(axis=0)
+        if direction == "down" and price is not None:
+            cost = -(pw * (price - mc[None, :])).sum(axis=0)
+        else:
+            cost = energy * mc
+
+        carrier = (gi["carrier"][0][pos], gi["carrier"][1])
+        bus = (gi["bus"][0][pos], gi["bus"][1])
+
+        rows += _rows(stage, f"ramp_{direction}", _grouped(energy, carrier))
+        rows += _rows(stage, f"ramp_{direction}_bus", _grouped(energy, bus))[:-1]
+        rows += _rows(stage, f"ramp_{direction}_cost", _grouped(cost, carrier))
+        if month is not None:
+            rows += _rows(stage, f"ramp_{direction}_month", _grouped(pw.sum(axis=1), month))[:-1]
+
+    return rows
+
+
+def redispatch_series(n, stage, gi=None):
+    '''
+    Hourly redispatch volume [MW] up and down
+    '''
+    gi = generator_index(n) if gi is None else gi
+
+    p = n.generators_t.p.values
+    return {
+        (stage, "ramp up"): pd.Series(p[:, gi["up"]].sum(axis=1), n.generators_t.p.index),
+        (stage, "ramp down"): pd.Series(p[:, gi["down"]].sum(axis=1), n.generators_t.p.index),
+    }
+
+
+def congestion_kpis(n, stage, tol=1e-3):
+    '''
+    Congested hours per line and DC link, loading within `tol` of the rating
+    '''
+    rows = []
+    for c, flow, rating in [("Line", n.lines_t.p0, n.lines.s_nom * n.lines.s_max_pu),
+                            ("Link", n.links_t.p0, n.links.p_nom * n.links.p_max_pu)]:
+        if flow.empty:
+            continue
+        if c == "Link":
+            flow = flow.loc[:, flow.columns.isin(n.links.index[n.links.carrier == "DC"])]
+        r = rating.reindex(flow.columns).values
+        congested = (np.abs(flow.values) >= r[None, :] * (1 - tol)) & (r[None, :] > 0)
+        hours = pd.Series(congested.sum(axis=0), index=flow.columns)
+        rows += _rows(stage, f"congested_hours_{c.lower()}", hours)
+    return rows
+
+
+def electrolysis_kpis(n, stage, li=None):
+    '''
+    Utilisation of each electrolyser (full load hours / hours) and total
+    '''
+    li = link_index(n) if li is None else li
+    pos = li["ely"]
+    if not len(pos):
+        return []
+
+    w = n.snapshot_weightings.generators.reindex(n.links_t.p0.index).values
+    energy = w @ n.links_t.p0.values[:, pos]
+    capacity = li["p_nom"][pos] * w.sum()
+
+    # by the nodal bus in the name ("<bus> <carrier>"), bus0 is the bidding zone in m
+    names = n.links_t.p0.columns[pos]
+    location = [name.removesuffix(" " + carrier) for name, carrier in zip(names, n.links.carrier.reindex(names))]
+    util = pd.Series(energy / capacity, index=location)
+    rows = [(stage, "ely_utilisation", g, v) for g, v in util.items()]
+    rows.append((stage, "ely_utilisation", "", energy.sum() / capacity.sum()))
+    return rows
+
+
+def matching_residual(n, gi=None, li=None):
+    '''
+    Hourly residual of the hourly matching constraint:
+    CI generation + discharge * efficiency - charge - electrolysis
+    '''
+    gi = generator_index(n) if gi is None else gi
+    li = link_index(n) if li is None else li
+
+    p0 = n.links_t.p0.values
+    residual = n.generators_t.p.values[:, gi["ci"]].sum(axis=1) \
+        + p0[:, li["dis"]] @ li["efficiency"][li["dis"]] \
+        - p0[:, li["ch"]].sum(axis=1) \
+        - p0[:, li["ely"]].sum(axis=1)
+    return pd.Series(residual, index=n.links_t.p0.index)
+
+
+def stage_kpis(networks):
+    '''
+    Full KPI set of the solved stages in `networks` (dict stage name -> network)
+    '''
+    rows = [(stage, "objective", "", n.objective) for stage, n in networks.items()]
+
+    if "m" in networks and "n" in networks:
+        rows.append(("n", "cm_cost", "", networks["n"].objective - networks["m"].objective))
+    if "n_custom" in networks:
+        rows.append(("n_custom", "cm_cost", "", networks["n_custom"].objective))
+
+    for stage, n in networks.items():
+        gi, li = generator_index(n), link_index(n)
+        if stage in ["n", "n_custom"]:
+            price = None
+            if stage == "n_custom" and "m" in networks:
+                price = ramp_down_prices(networks["m"], n, n.generators_t.p.columns[gi["down"]],
+                                         n.generators_t.p.index)
+            rows += redispatch_kpis(n, stage, price, gi)
+            rows += congestion_kpis(n, stage)
+        rows += electrolysis_kpis(n, stage, li)
+        if len(li["ely"]):
+            residual = np.abs(matching_residual(n, gi, li).values)
+            rows += [(stage, "matching_residual_max", "", residual.max()),
+                     (stage, "matching_residual_sum", "", residual.sum())]
+
+    return pd.DataFrame(rows, columns=["stage", "kpi", "group", "value"])
+
+
+def stage_series(networks):
+    '''
+    Hourly series of the solved stages in `networks`, columns (stage, series)
+    '''
+    series = {}
+    if "m" in networks:
+        m = networks["m"]
+        zones = m.buses.index[m.buses.carrier == "AC"].intersection(m.buses_t.marginal_price.columns)
+        for zone in zones:
+            series[("m", f"price {zone}")] = m.buses_t.marginal_price[zone]
+
+    for stage in ["n", "n_custom"]:
+        if stage in networks:
+            series.update(redispatch_series(networks[stage], stage))
+
+    return pd.DataFrame(series)
+
+
+def ramp_volume(n, direction):
+    '''
+    Total redispatch volume [MWh] of the "ramp up" or "ramp down" generators
+    '''
+    gi = generator_index(n)
+    w = n.snapshot_weightings.generators.reindex(n.generators_t.p.index).values
+    return w @ n.generators_t.p.values[:, gi[direction.split(" ")[-1]]].sum(axis=1)
+
+
+#########################################################################################
+# Many result directories in parallel
+def results_dir_kpis(results_dir, suffix="", stages=("m", "n", "n_custom")):
+    '''
+    KPIs of the `stages` exported to `results_dir` (o.nc, o2.nc, m.nc, n.nc, n_custom.nc)
+    '''
+    from .export import load_delta_network
+
+    networks = {}
+    for stage in stages:
+        path = os.path.join(results_dir, stage + suffix + ".nc")
+        if os.path.exists(path):
+            networks[stage] = load_delta_network(path)
+
+    return stage_kpis(networks).assign(results_dir=results_dir)
+
+
+def process_results_dirs(results_dirs, processes=None, suffix=""):
+    '''
+    KPIs of many result directories, one worker process per directory
+    '''
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        frames = list(pool.map(results_dir_kpis, results_dirs, [suffix] * len(results_dirs)))
+
+    return pd.concat(frames, ignore_index=True)
+
@@ -0,0 +1,155 @@
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Per-stage profiling
+#
+# With config["profiling"] enabled, the stages in profiling.stages run under a profiler:
+#   cprofile  deterministic (cProfile), <stage>.prof for pstats/snakeviz/gprof2dot
+#   sampling  the stack of the stage's thread every `interval` seconds, low overhead
+# Both write <stage>.collapsed (one "frame;frame;... count" line per stack, the input of
+# flamegraph.pl, speedscope or inferno; for cprofile built from the caller graph, so stacks
+# are caller;callee pairs) and <stage>.top.txt with the hottest functions, into
+# <results_dir>/profiles/. The top functions also go into the performance report.
+# A stage solved within another profiled stage (m pulled by n) is part of the outer profile.
+
+_active = []
+
+
+def _label(code):
+
+    return f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}"
+
+
+class StackSampler(threading.Thread):
+    '''
+    Samples the stack of thread `ident` every `interval` seconds
+    '''
+
+    def __init__(self, ident, interval=0.005):
+
+        super().__init__(name="stack-sampler", daemon=True)
+        self.ident = ident
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+
+        while not self._stop_event.is_set():
+            frame = sys._current_frames().get(self.ident)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+
+        self._stop_event.set()
+        self.join()
+
+
+def _sampling_top(stacks, top):
+    '''
+    Functions by samples on top of the stack (self) and anywhere in it (total)
+    '''
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    samples = sum(stacks.values()) or 1
+    lines = [f"{'self %':>8} {'total %':>8}  function", ]
+    lines += [f"{100 * c / samples:8.1f} {100 * total[f] / samples:8.1f}  {f}" for f, c in own.most_common(top)]
+    return lines, [f for f, _ in own.most_common(top)]
+
+
+def _cprofile_collapsed(stats):
+    '''
+    Collapsed caller;callee stacks with the internal time in microseconds
+    '''
+    stacks = Counter()
+    for (file, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+        callee = f"{os.path.splitext(os.path.basename(file))[0]}:{func}"
+        if not callers:
+            stacks[callee] += int(tt * 1e6)
+        for (cfile, cline, cfunc), caller_stats in callers.items():
+            caller = f"{os.path.splitext(os.path.basename(cfile))[0]}:{cfunc}"
+            stacks[f"{caller};{callee}"] += int(caller_stats[2] * 1e6)
+    return stacks
+
+
+def _write(path, stacks, lines):
+
+    with open(path + ".collapsed", "w") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks.items() if count > 0)
+    with open(path + ".top.txt", "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profiled(config, stage, results_dir):
+    '''
+    Run the enclosed stage under the profiler of config["profiling"] if `stage` is selected
+    '''
+    profiling = config.get("profiling", {})
+    if not profiling.get("enabled", False) or stage.split("-")[0] not in profiling.get("stages", []) or _active:
+        yield
+        return
+
+    from .solving import record
+
+    directory = os.path.join(results_dir, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, stage)
+    mode, top = profiling.get("mode", "sampling"), profiling.get("top", 30)
+
+    start = time.time()
+    _active.append(stage)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == "sampling":
+        profiler = StackSampler(threading.get_ident(), profiling.get("interval", 0.005))
+        profiler.start()
+    else:
+        raise ValueError(f"unknown profiling mode {mode}")
+
+    try:
+        yield
+    finally:
+        _active.pop()
+        if mode == "cprofile":
+            profiler.disable()
+            profiler.dump_stats(path + ".prof")
+            text = io.StringIO()
+            stats = pstats.Stats(profiler, stream=text)
+            stats.sort_stats("tottime").print_stats(top)
+            lines = text.getvalue().splitlines()
+            hot = [f"{os.path.splitext(os.path.basename(f))[0]}:{fn}"
+                   for f, _, fn in stats.fcn_list[:top]] if stats.fcn_list else []
+            _write(path, _cprofile_collapsed(stats), lines)
+        else:
+            profiler.stop()
+            lines, hot = _sampling_top(profiler.stacks, top)
+            _write(path, profiler.stacks, lines)
+
+        record(stage, profile={"mode": mode, "seconds": round(time.time() - start, 2),
+                               "files": os.path.relpath(path, results_dir), "top": hot[:10]})
+        logger.info(f"profile of {stage} written to {path}.collapsed, top functions in {path}.top.txt")
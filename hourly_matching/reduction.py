@@ -0,0 +1,172 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Spatial reduction for screening runs
+#
+# With config["reduction"] enabled, the loaded input network is clustered to `buses` AC buses
+# before the system is built: the clusters are distributed over the countries (and their
+# synchronous areas) in proportion to their load, the buses of each are grouped by k-means
+# on their coordinates. Generators, loads and storage units are aggregated per cluster and
+# carrier (PyPSA clustering), lines between clusters are aggregated, non-AC buses (battery,
+# H2) follow the AC bus they are linked to. The electrolysers of prepare_elys are summed per
+# cluster, so the elys file of the input network (scenario.buses) is used unchanged.
+# The busmap is written to <results_dir>/busmap.csv, other networks of the same system
+# (weather years) are clustered with it. The 2019 network is clustered with the AC busmap
+# of the 2030 input network, so both runs have the same zones.
+
+
+def _allocate(load, total):
+    '''
+    Clusters per group in proportion to `load`, at least 1, at most the number of buses
+    '''
+    buses = load["buses"]
+    share = load["load"] / load["load"].sum() if load["load"].sum() > 0 else buses / buses.sum()
+    n_clusters = np.clip(np.floor(share * total), 1, buses).astype(int)
+
+    # largest remainder for the clusters left
+    remainder = (share * total - n_clusters).sort_values(ascending=False)
+    for group in remainder.index:
+        if n_clusters.sum() >= total:
+            break
+        if n_clusters[group] < buses[group]:
+            n_clusters[group] += 1
+
+    return n_clusters
+
+
+def busmap_by_country(n, buses, seed=0):
+    '''
+    AC bus -> cluster name ("<country><sub network> <i>"), `buses` clusters in total
+    '''
+    from scipy.cluster.vq import kmeans2
+
+    n.determine_network_topology()
+    ac = n.buses[n.buses.carrier == "AC"]
+    group = ac.country.fillna("") + ac.sub_network.astype(str)
+
+    load = n.loads_t.p_set.mean().groupby(n.loads.bus).sum().reindex(ac.index).fillna(0) \
+        if not n.loads_t.p_set.empty else pd.Series(0., ac.index)
+    load = load.groupby(group).sum().to_frame("load").assign(buses=group.value_counts())
+
+    if buses < len(load):
+        logger.warning(f"reduction: {buses} buses are fewer than the {len(load)} countries and areas, "
+                       f"one bus each")
+    n_clusters = _allocate(load, buses)
+
+    busmap = []
+    for g, k in n_clusters.items():
+        members = group.index[group == g]
+        if k >= len(members):
+            labels = np.arange(len(members))
+        else:
+            xy = ac.loc[members, ["x", "y"]].values
+            _, labels = kmeans2(xy, k, seed=seed, minit="++")
+            labels = pd.factorize(labels)[0]  # empty clusters are dropped
+        busmap.append(pd.Series([f"{g} {i}" for i in labels], index=members))
+
+    return pd.concat(busmap)
+
+
+def full_busmap(n, ac_busmap):
+    '''
+    Extend the AC busmap to the non-AC buses, which follow the AC bus they are linked to
+    '''
+    links = pd.concat([n.links[["bus0", "bus1"]],
+                       n.links[["bus1", "bus0"]].set_axis(["bus0", "bus1"], axis=1)])
+    links = links[links.bus0.isin(ac_busmap.index) & ~links.bus1.isin(ac_busmap.index)]
+    location = links.drop_duplicates("bus1").set_index("bus1").bus0
+
+    other = n.buses.index.difference(ac_busmap.index)
+    mapped = pd.Series(other, index=other)
+    linked = other.intersection(location.index)
+    mapped[linked] = ac_busmap[location[linked]].values + " " + n.buses.carrier[linked].values
+
+    return pd.concat([ac_busmap, mapped])
+
+
+def cluster_network(n, busmap, config):
+    '''
+    Copy of `n` clustered with `busmap`, e.g. another weather year of the reduced network
+    '''
+    from pypsa.clustering.spatial import get_clustering_from_busmap
+
+    missing = n.buses.index.difference(busmap.index)
+    if len(missing):
+        raise ValueError(f"reduction: {len(missing)} buses not in the busmap, e.g. {list(missing[:3])}")
+
+    clustering = get_clustering_from_busmap(
+        n, busmap,
+        line_length_factor=config.get("reduction", {}).get("line_length_factor", 1.25),
+        aggregate_one_ports=["Load", "StorageUnit"],
+        aggregate_generators_weighted=True,
+    )
+    return clustering.network
+
+
+def ac_busmap_of(n, config):
+    '''
+    AC busmap of the reduction of `n` (k-means of busmap_by_country)
+    '''
+    reduction = config["reduction"]
+    return busmap_by_country(n, reduction["buses"], reduction.get("seed", 0))
+
+
+def reduce_network(n, config, ac_busmap=None):
+    '''
+    Clustered copy of `n` and the busmap (input bus -> cluster), `n` and None if disabled.
+    `ac_busmap` clusters `n` like another network of the same grid (2019 like 2030).
+    '''
+    reduction = config.get("reduction", {})
+    if not reduction.get("enabled", False):
+        return n, None
+
+    busmap = full_busmap(n, ac_busmap_of(n, config) if ac_busmap is None else ac_busmap)
+    c = cluster_network(n, busmap, config)
+
+    logger.info(f"reduction: {(n.buses.carrier == 'AC').sum()} -> {(c.buses.carrier == 'AC').sum()} AC buses, "
+                f"{len(n.lines)} -> {len(c.lines)} lines, {len(n.generators)} -> {len(c.generators)} generators")
+
+    return c, busmap
+
+
+def write_busmap(busmap, results_dir):
+
+    busmap.rename_axis("bus").rename("cluster").to_csv(results_dir + "busmap.csv")
+
+
+def read_busmap(results_dir):
+    '''
+    Busmap of the reduced run in `results_dir` (written by prepare_system), None at full resolution
+    '''
+    path = results_dir + "busmap.csv"
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, index_col=0, dtype=str)["cluster"]
+
+
+def reduce_elys(h2buses_df, busmap):
+    '''
+    Electrolyser capacities of prepare_elys summed per cluster
+    '''
+    if busmap is None or h2buses_df is None:
+        return h2buses_df
+
+    return h2buses_df.rename(index=busmap).groupby(level=0).sum()
+
+
+def reduction_label(config):
+    '''
+    Suffix of the results directory of reduced runs (buses, k-means seed, line length factor),
+    "" at full resolution
+    '''
+    reduction = config.get("reduction", {})
+    if not reduction.get("enabled", False):
+        return ""
+    return f"_{reduction['buses']}b_s{reduction.get('seed', 0)}_l{reduction.get('line_length_factor', 1.25):g}"
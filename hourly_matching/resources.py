@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Resource sampler
+#
+# With config["resources"] enabled, a background thread samples the RSS (of the process and
+# its children, e.g. a solver binary), the CPU utilisation and the thread count every
+# `interval` seconds while the stages run. Each sample is tagged with the current stage and
+# sub-phase (prepare: copies and network changes, build: linopy model, solve, export:
+# netCDF dataset). The timeline goes to <results_dir>/resources.csv, the peaks per stage into
+# the performance report. Exports written in the background overlap the next stage and are
+# counted there. Uses psutil if installed, /proc/self otherwise (Linux, no children).
+
+_current = {"stage": None, "phase": None}
+
+
+@contextmanager
+def phase(name, stage=None):
+    '''
+    Tag the samples taken within the context with `name` (and `stage`)
+    '''
+    previous = dict(_current)
+    _current["phase"] = name
+    if stage is not None:
+        _current["stage"] = stage
+    try:
+        yield
+    finally:
+        _current.update(previous)
+
+
+def set_phase(name):
+    '''
+    Switch the phase of the enclosing `phase` context, e.g. from build to solve
+    '''
+    _current["phase"] = name
+
+
+def _proc_status():
+    '''
+    RSS [bytes] and threads of this process from /proc/self/status
+    '''
+    status = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.split()
+    return int(status["VmRSS"][0]) * 1024, int(status["Threads"][0])
+
+
+class Sampler(threading.Thread):
+
+    def __init__(self, interval=0.5, children=True):
+
+        super().__init__(name="resource-sampler", daemon=True)
+        self.interval = interval
+        self.children = children
+        self.samples = []
+        self._stop_event = threading.Event()
+
+        try:
+            import psutil
+            self._process = psutil.Process()
+            self._process.cpu_percent()
+            self._children = {}
+        except ImportError:
+            self._process = None
+            logger.info("psutil not installed, resource sampler reads /proc/self (no child processes)")
+
+    def _psutil_sample(self):
+
+        rss = self._process.memory_info().rss
+        cpu = self._process.cpu_percent()
+        threads = self._process.num_threads()
+
+        if self.children:
+            import psutil
+            for child in self._process.children(recursive=True):
+                try:
+                    # cpu_percent is relative to the previous call on the same Process object
+                    child = self._children.setdefault(child.pid, child)
+                    rss += child.memory_info().rss
+                    cpu += child.cpu_percent()
+                    threads += child.num_threads()
+                except psutil.Error:
+                    self._children.pop(child.pid, None)
+
+        return rss, cpu, threads
+
+    def _proc_sample(self):
+
+        rss, threads = _proc_status()
+        now, cpu_time = time.time(), sum(os.times()[:2])
+        last = getattr(self, "_last", None)
+        self._last = (now, cpu_time)
+        cpu = 100 * (cpu_time - last[1]) / (now - last[0]) if last and now > last[0] else float("nan")
+        return rss, cpu, threads
+
+    def run(self):
+
+        while not self._stop_event.is_set():
+            try:
+                rss, cpu, threads = self._psutil_sample() if self._process is not None else self._proc_sample()
+            except Exception as e:
+                logger.warning(f"resource sampler stopped ({e})")
+                return
+            self.samples.append((time.time(), _current["stage"], _current["phase"], rss / 1e6, cpu, threads))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+
+        self._stop_event.set()
+        self.join()
+
+    def timeline(self):
+
+        df = pd.DataFrame(self.samples, columns=["time", "stage", "phase", "rss_mb", "cpu_percent", "threads"])
+        if len(df):
+            df["time"] = (df.time - df.time.iloc[0]).round(3)
+        return df
+
+
+def start_sampler(config):
+    '''
+    Start the resource sampler of config["resources"], None if disabled
+    '''
+    resources = config.get("resources", {})
+    if not resources.get("enabled", False):
+        return None
+
+    sampler = Sampler(resources.get("interval", 0.5), resources.get("children", True))
+    sampler.start()
+    return sampler
+
+
+def stop_sampler(sampler, results_dir):
+    '''
+    Stop `sampler`, write the timeline and add the peaks per stage to the performance report
+    '''
+    from .solving import record
+
+    if sampler is None:
+        return None
+
+    sampler.stop()
+    timeline = sampler.timeline()
+    timeline.to_csv(os.path.join(results_dir, "resources.csv"), index=False)
+
+    for stage, df in timeline.dropna(subset=["stage"]).groupby("stage"):
+        peak = df.loc[df.rss_mb.idxmax()]
+        record(stage, peak_rss_mb=round(float(peak.rss_mb), 1), peak_rss_phase=str(peak.phase),
+               peak_rss_by_phase={str(p): round(float(v), 1) for p, v in df.groupby("phase").rss_mb.max().items()},
+               mean_cpu_percent=round(float(df.cpu_percent.mean()), 1),
+               max_threads=int(df.threads.max()))
+
+    if len(timeline):
+        # whole run, e.g. for the memory request of the batch job
+        record("run", peak_rss_mb=round(float(timeline.rss_mb.max()), 1),
+               samples=len(timeline), interval=sampler.interval)
+        logger.info(f"peak RSS {round(timeline.rss_mb.max())} MB "
+                    f"({timeline.loc[timeline.rss_mb.idxmax(), ['stage', 'phase']].tolist()}), "
+                    f"timeline in {os.path.join(results_dir, 'resources.csv')}")
+
+    return timeline
@@ -0,0 +1,176 @@
+import os
+import uuid
+
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .postprocessing import stage_kpis, stage_series
+from .config_keys import config_hash
+
+
+#########################################################################################
+# Columnar cross-scenario results store
+#
+# <dir>/kpis/run=<run>/<key>=<value>/.../config=<hash>/part.parquet     stage, kpi, group, value
+# <dir>/series/run=<run>/<key>=<value>/.../config=<hash>/part.parquet   snapshot, stage, series, value
+#
+# Partition keys (config["results_store"]["partition_on"]) live in the directory names,
+# the remaining scenario keys are stored as columns. The last level is the hash of the
+# model-defining config (see config_keys.py), so scenarios that differ in any other key
+# (res_share, h2_storage, reduction, global parameters, ...) get their own file. One file
+# per run and scenario, rerunning a scenario replaces it atomically. Needs pyarrow.
+
+
+def run_kpis(networks):
+    '''
+    KPIs of the solved stages in `networks` (dict stage name -> network), long format
+    '''
+    return stage_kpis(networks)
+
+
+def run_series(networks):
+    '''
+    Hourly series of the solved stages in `networks`, long format
+    '''
+    df = stage_series(networks)
+    if df.empty:
+        return pd.DataFrame(columns=["snapshot", "stage", "series", "value"])
+
+    df.columns.names = ["stage", "series"]
+    df.index.name = "snapshot"
+
+    return df.stack(["stage", "series"]).rename("value").reset_index()
+
+
+def _partition_dir(table, run, config):
+
+    store = config["results_store"]
+    scenario = config["scenario"]
+
+    parts = [f"run={run}"] + [f"{k}={scenario[k]}" for k in store["partition_on"]] \
+        + [f"config={config_hash(config)}"]
+    return os.path.join(store["dir"], table, *parts)
+
+
+def _write_parquet(df, path):
+    '''
+    Write `df` to `path` via a temporary file, concurrent writers never leave a partial file
+    '''
+    # hidden name, not picked up by a dataset scan of the store
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_run_to_store(networks, config, run="scenario"):
+    '''
+    Write KPIs and series of the solved stages of one run into the results store
+    '''
+    store = config.get("results_store", {})
+    if not store.get("enabled", False):
+        return
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.error("results store: pyarrow is not installed, run not written to the store "
+                     "(install pyarrow and backfill with ingest_results_dir, or disable results_store)")
+        return
+
+    scenario = config["scenario"]
+    columns = {k: str(v) for k, v in scenario.items() if k not in store["partition_on"]}
+
+    for table, df in [("kpis", run_kpis(networks)), ("series", run_series(networks))]:
+
+        path = _partition_dir(table, run, config)
+        os.makedirs(path, exist_ok=True)
+
+        df = df.assign(**columns)
+        _write_parquet(df, os.path.join(path, "part.parquet"))
+
+    logger.info(f"results store: wrote {run} run to {_partition_dir('kpis', run, config)}")
+
+
+def ingest_results_dir(results_dir, config, run="scenario", suffix=""):
+    '''
+    Backfill the store from exported stages (e.g. results/<scenario>/n.nc) of an earlier run.
+    `config["scenario"]` has to describe the scenario of `results_dir`.
+    '''
+    from .export import load_delta_network
+
+    networks = {}
+    for stage in ["o", "o2", "m", "n", "n_custom"]:
+        path = os.path.join(results_dir, stage + suffix + ".nc")
+        if os.path.exists(path):
+            networks[stage] = load_delta_network(path)
+
+    write_run_to_store(networks, config, run)
+
+
+#########################################################################################
+# Query API
+def _query(store_dir, table, columns=None, **filters):
+
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+
+    path = os.path.join(store_dir, table)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+
+    dataset = pads.dataset(path, format="parquet", partitioning="hive")
+
+    expr = None
+    for key, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        field = dataset.schema.field(key)
+        # partition columns are typed by inference, stored scenario keys are strings
+        values = [str(v) if pa.types.is_string(field.type) else v for v in values]
+        e = pads.field(key).isin(values)
+        expr = e if expr is None else expr & e
+
+    return dataset.to_table(filter=expr, columns=columns).to_pandas()
+
+
+def query_kpis(store_dir, kpis=None, stage=None, pivot=True, **filters):
+    '''
+    KPIs across scenarios, filtered by scenario keys, e.g.
+    query_kpis("results/store", kpis=["cm_cost"], operation_mode="flexible", ely_cap=[8000, 10000])
+    With pivot, one row per scenario and stage with KPI (and group) columns.
+    '''
+    if kpis is not None:
+        filters["kpi"] = kpis
+    if stage is not None:
+        filters["stage"] = stage
+
+    df = _query(store_dir, "kpis", **filters)
+    if df.empty or not pivot:
+        return df
+
+    keys = [c for c in df.columns if c not in ["kpi", "group", "value"]]
+    df["kpi"] = df.kpi.where(df.group == "", df.kpi + " " + df.group)
+
+    return df.pivot_table(index=keys, columns="kpi", values="value", aggfunc="first")
+
+
+def query_series(store_dir, series=None, stage=None, **filters):
+    '''
+    Hourly series across scenarios with one column per scenario, stage and series
+    '''
+    if series is not None:
+        filters["series"] = series
+    if stage is not None:
+        filters["stage"] = stage
+
+    df = _query(store_dir, "series", **filters)
+    if df.empty:
+        return df
+
+    keys = [c for c in df.columns if c not in ["snapshot", "value"]]
+    return df.pivot_table(index="snapshot", columns=keys, values="value", aggfunc="first")
@@ -0,0 +1,209 @@
+import os
+
+import numpy as np
+import pandas as pd
+import yaml
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .postprocessing import results_dir_kpis
+
+
+#########################################################################################
+# Sampling sensitivity
+#
+# config["sampling"]["parameters"] declares ranges of config entries by dotted key, e.g.
+#   global.co2_price_2030: [80, 200]
+# Latin-hypercube or Sobol samples over the ranges run through the parallel sweep (optionally
+# only up to a stage), every sample in <dir>/<i>/. A quadratic least-squares surrogate per KPI
+# ("<stage>.<kpi>", total over groups) is fitted on the inputs scaled to [0, 1] and written to
+# <dir>/surrogate.yaml, so further queries (`predict`) and the Sobol indices of the KPIs need
+# no solves. Fit quality: in-sample and leave-one-out R^2.
+
+
+def draw_samples(parameters, samples, method="lhs", seed=None):
+    '''
+    `samples` points over the ranges of `parameters` ({dotted key: [low, high]})
+    '''
+    from scipy.stats import qmc
+
+    keys = list(parameters)
+    low, high = np.array([parameters[k] for k in keys], dtype=float).T
+
+    if method == "sobol":
+        # balanced for powers of 2
+        unit = qmc.Sobol(len(keys), scramble=True, seed=seed).random(samples)
+    elif method == "lhs":
+        unit = qmc.LatinHypercube(len(keys), seed=seed).random(samples)
+    else:
+        raise ValueError(f"unknown sampling method {method}")
+
+    return pd.DataFrame(qmc.scale(unit, low, high), columns=keys)
+
+
+def sample_overrides(point, i, settings):
+    '''
+    Config overrides of sample `i`, with its own results directory
+    '''
+    overrides = {**settings.get("overrides", {}), **{k: float(v) for k, v in point.items()}}
+    overrides["results_dir"] = os.path.join(settings["dir"], str(i))
+    # runs of different samples share the partition keys of the results store
+    overrides["results_store.enabled"] = False
+    return overrides
+
+
+def collect_kpis(points, settings, mode="scenario"):
+    '''
+    KPIs of the solved samples, one row per sample (NaN if a sample failed)
+    '''
+    from .pipeline import load_config, results_dir_for, MODES
+
+    # KPIs of the CM stages (cm_cost, redispatch costs) are computed against m
+    stages = {k.split(".", 1)[0] for k in settings["kpis"]}
+    stages = sorted(stages | ({"m"} if stages & {"n", "n_custom"} else set()))
+    rows = {}
+    for i, point in points.iterrows():
+        config = load_config(settings["config"], sample_overrides(point, i, settings))
+        kpis = results_dir_kpis(results_dir_for(config, mode), MODES[mode]["suffix"], stages)
+        totals = kpis[kpis.group == ""].set_index(["stage", "kpi"]).value
+        rows[i] = {k: totals.get(tuple(k.split(".", 1)), np.nan) for k in settings["kpis"]}
+
+    return pd.DataFrame.from_dict(rows, orient="index").reindex(points.index)
+
+
+#########################################################################################
+# Surrogates
+def _unit(points, bounds):
+
+    low, high = np.array([bounds[k] for k in points.columns], dtype=float).T
+    return (points.values - low) / (high - low)
+
+
+def _features(x, degree):
+    '''
+    Polynomial features 1, x_i (and x_i * x_j for degree 2)
+    '''
+    columns = [np.ones(len(x))] + [x[:, i] for i in range(x.shape[1])]
+    if degree == 2:
+        columns += [x[:, i] * x[:, j] for i in range(x.shape[1]) for j in range(i, x.shape[1])]
+    return np.column_stack(columns)
+
+
+def fit_surrogate(points, kpis, bounds, degree=2):
+    '''
+    Least-squares polynomial surrogate per KPI. Falls back to degree 1 if there are fewer
+    samples than coefficients.
+    '''
+    x = _unit(points, bounds)
+    if degree == 2 and len(x) <= _features(x[:1], 2).shape[1]:
+        logger.warning(f"{len(x)} samples are too few for a quadratic surrogate, fitting a linear one")
+        degree = 1
+
+    surrogate = {"parameters": list(points.columns), "bounds": {k: list(map(float, bounds[k])) for k in points.columns},
+                 "degree": degree, "kpis": {}}
+
+    for kpi, y in kpis.items():
+        ok = y.notna().values
+        X, y = _features(x[ok], degree), y.values[ok]
+        if len(y) < X.shape[1]:
+            logger.warning(f"surrogate {kpi}: {len(y)} samples, skipped")
+            continue
+
+        coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+        residual = y - X @ coef
+        # leave-one-out residuals from the leverages of the hat matrix
+        leverage = np.einsum("ij,ji->i", X, np.linalg.pinv(X))
+        loo = residual / np.clip(1 - leverage, 1e-9, None)
+        ss = ((y - y.mean())**2).sum()
+
+        surrogate["kpis"][kpi] = {
+            "coef": coef.tolist(),
+            "r2": float(1 - (residual**2).sum() / ss) if ss > 0 else 1.,
+            "r2_loo": float(1 - (loo**2).sum() / ss) if ss > 0 else 1.,
+        }
+        logger.info(f"surrogate {kpi}: R2 {round(surrogate['kpis'][kpi]['r2'], 3)}, "
+                    f"leave-one-out R2 {round(surrogate['kpis'][kpi]['r2_loo'], 3)}")
+
+    return surrogate
+
+
+def predict(surrogate, points):
+    '''
+    KPIs of `points` (DataFrame with the sampled parameters as columns) from the surrogate
+    '''
+    points = points[surrogate["parameters"]]
+    X = _features(_unit(points, surrogate["bounds"]), surrogate["degree"])
+    return pd.DataFrame({kpi: X @ np.array(s["coef"]) for kpi, s in surrogate["kpis"].items()},
+                        index=points.index)
+
+
+def sobol_indices(surrogate, samples=2**14, seed=None):
+    '''
+    First-order (Saltelli) and total (Jansen) Sobol indices of every KPI, evaluated on the surrogate
+    '''
+    rng = np.random.default_rng(seed)
+    keys = surrogate["parameters"]
+    low, high = np.array([surrogate["bounds"][k] for k in keys], dtype=float).T
+
+    def f(unit):
+        return predict(surrogate, pd.DataFrame(low + unit * (high - low), columns=keys))
+
+    A, B = rng.random((samples, len(keys))), rng.random((samples, len(keys)))
+    fA, fB = f(A), f(B)
+    variance = pd.concat([fA, fB]).var()
+
+    rows = []
+    for i, key in enumerate(keys):
+        ABi = A.copy()
+        ABi[:, i] = B[:, i]
+        fABi = f(ABi)
+        first = (fB * (fABi - fA)).mean() / variance
+        total = 0.5 * ((fA - fABi)**2).mean() / variance
+        rows += [{"kpi": kpi, "parameter": key, "first_order": first[kpi], "total": total[kpi]}
+                 for kpi in fA.columns]
+
+    return pd.DataFrame(rows).set_index(["kpi", "parameter"])
+
+
+def load_surrogate(path):
+
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+#########################################################################################
+def run_sampling(config_path, config, mode="scenario", processes=None, solve=True, overrides=None):
+    '''
+    Draw the samples, solve them in parallel, fit the surrogates and compute the Sobol indices.
+    Results in config["sampling"]["dir"]: samples.csv, kpis.csv, surrogate.yaml, sensitivity.csv
+    '''
+    from .cli import sweep
+
+    settings = dict(config["sampling"], config=config_path, overrides=overrides or {})
+    os.makedirs(settings["dir"], exist_ok=True)
+
+    path = os.path.join(settings["dir"], "samples.csv")
+    if solve or not os.path.exists(path):
+        points = draw_samples(settings["parameters"], settings["samples"],
+                              settings.get("method", "lhs"), settings.get("seed"))
+        points.to_csv(path)
+    else:
+        points = pd.read_csv(path, index_col=0)
+
+    if solve:
+        logger.info(f"sampling: {len(points)} {settings.get('method', 'lhs')} samples of {list(points.columns)}")
+        grid = [sample_overrides(point, i, settings) for i, point in points.iterrows()]
+        sweep(config_path, grid, mode, until=settings.get("until"), processes=processes)
+
+    kpis = collect_kpis(points, settings, mode)
+    kpis.to_csv(os.path.join(settings["dir"], "kpis.csv"))
+
+    surrogate = fit_surrogate(points, kpis, settings["parameters"], settings.get("degree", 2))
+    with open(os.path.join(settings["dir"], "surrogate.yaml"), "w") as f:
+        yaml.safe_dump(surrogate, f, sort_keys=False)
+
+    indices = sobol_indices(surrogate, seed=settings.get("seed"))
+    indices.to_csv(os.path.join(settings["dir"], "sensitivity.csv"))
+
+    return surrogate, indices
@@ -0,0 +1,155 @@
+import copy
+import tempfile
+
+import pandas as pd
+from pypsa.descriptors import get_switchable_as_dense as as_dense
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Pre-solve screening of scenario configurations
+#
+# Necessary conditions of the hourly matching scenario, checked before a run is queued:
+#   - electrolyser capacity can deliver the offtake volume
+#   - CI renewable potential (nom_max_* of the template generators) covers the electrolysis
+#   - without H2 store and CI battery, CI generation is available in every snapshot
+# Findings are "reject" (infeasible) or "flag" (degenerate, or beyond physical potential).
+# Optionally the expansion o is solved on the means of `stride` consecutive hours (see
+# horizon.aggregate_snapshots), a relaxation of the full problem: infeasible there means
+# infeasible for the full year.
+
+STORE_OPTIONS = ["medium", "flexible", "cavern"]
+
+# only an infeasible relaxation proves the scenario infeasible; unbounded or
+# infeasible_or_unbounded say nothing about the full model and are flagged
+REJECT_CONDITIONS = ["infeasible"]
+
+
+def finding(level, check, message):
+
+    return {"level": level, "check": check, "message": message}
+
+
+def electrolysis_demand(config, hours=8760):
+    '''
+    Electricity [MWh] the electrolysers need for the offtake volume over `hours`
+    '''
+    return config["scenario"]["offtake_volume"] / config["global"]["electrolyser"]["efficiency"] * hours
+
+
+def ci_potential(n, config):
+    '''
+    Available energy [MWh] of the CI technologies and the snapshots without any CI output.
+    Per bus the potential of a technology is nom_max minus the existing capacity of its
+    template generator, as annotated on the buses by add_CI_gen_bat.
+    '''
+    templates = n.generators[n.generators.carrier.isin(config['ci']['res_techs'])
+                             & n.generators.bus.isin(n.buses.index[n.buses.carrier == "AC"])
+                             & ~n.generators.index.str.contains(config['ci']['name'])]
+    templates = templates[templates.index == templates.bus + " " + templates.carrier]
+
+    p_max_pu = as_dense(n, "Generator", "p_max_pu")[templates.index].values
+    weights = n.snapshot_weightings.generators.values
+
+    potential = (templates.p_nom_max - templates.p_nom).clip(lower=0).values
+    energy = weights @ p_max_pu * potential
+
+    return {
+        "energy": pd.Series(energy, index=templates.index).groupby(templates.carrier.values).sum(),
+        "hours": weights.sum(),
+        "dark_snapshots": int((p_max_pu.max(axis=1, initial=0) <= 0).sum()),
+    }
+
+
+def screen_config(config, potential=None):
+    '''
+    Findings of the necessary checks for `config`, `potential` from ci_potential
+    (the potential checks are skipped without it)
+    '''
+    s = config["scenario"]
+    efficiency = config["global"]["electrolyser"]["efficiency"]
+    has_store = s["h2_storage"] in STORE_OPTIONS
+    has_battery = "battery" in config["ci"]["sto_techs"]
+    findings = []
+
+    # electrolyser capacity versus offtake (static mode resizes the electrolysers to the offtake)
+    h2_capacity = s["ely_cap"] * efficiency
+    if s["operation_mode"] == "static":
+        if has_store:
+            findings.append(finding("flag", "storage", "static operation runs the electrolysers at full load, "
+                                                       "the H2 store is redundant"))
+    elif h2_capacity < s["offtake_volume"]:
+        findings.append(finding("reject", "electrolyser_capacity",
+                                f"max. H2 output {h2_capacity:.0f} MWh/h below offtake {s['offtake_volume']} MWh/h"))
+    elif h2_capacity < s["offtake_volume"] * 1.001:
+        findings.append(finding("flag", "electrolyser_capacity",
+                                "electrolysers must run at full load in every hour (degenerate)"))
+
+    if potential is None:
+        return findings
+
+    # CI potential versus electrolysis demand
+    required = electrolysis_demand(config, potential["hours"])
+    available = potential["energy"].sum()
+    if available < required:
+        findings.append(finding("flag", "ci_potential",
+                                f"CI potential {available/1e6:.1f} TWh below electrolysis demand {required/1e6:.1f} TWh"))
+
+    # hourly matching without any storage needs CI output in every snapshot
+    if not has_store and not has_battery and not config["global"]["dummies"] and potential["dark_snapshots"] > 0:
+        findings.append(finding("reject", "storage",
+                                f"no H2 store or CI battery, {potential['dark_snapshots']} snapshots without CI output"))
+
+    return findings
+
+
+#########################################################################################
+# Time-aggregated relaxation
+def screen_relaxation(config, stride=24):
+    '''
+    Solve the expansion o on the means of every `stride` hours. Returns the findings: reject
+    if the aggregated problem is infeasible, flag (the scenario still runs) if the solve stopped
+    otherwise, e.g. unbounded. Errors of the build or the solver are raised.
+    '''
+    from .pipeline import context, prepare_system, solve_stage
+
+    config = copy.deepcopy(config)
+    config["horizon"] = {"enabled": True, "start": 0, "length": None, "stride": stride,
+                         "aggregate": True, "scale_capital_costs": True}
+    config["results_store"] = {"enabled": False}
+
+    # nothing of the aggregated solve (warm starts, artifacts) ends up in the results directory
+    with tempfile.TemporaryDirectory(prefix="screen_") as results_dir:
+        ctx = context(config, "scenario", results_dir=results_dir + "/")
+        o = prepare_system(ctx)
+        status, condition = solve_stage(ctx, o, "screen", soc_margin=0.01, battery_res=True)
+
+    if str(condition) in REJECT_CONDITIONS:
+        return [finding("reject", "relaxation", f"aggregated expansion {status} ({condition})")]
+    if status != "ok":
+        return [finding("flag", "relaxation", f"aggregated expansion {status} ({condition}), not conclusive")]
+    return []
+
+
+def screen(config, n=None, relaxation=False, stride=24):
+    '''
+    All findings for `config`. `n` is the input network for the potential checks.
+    '''
+    potential = ci_potential(n, config) if n is not None else None
+    findings = screen_config(config, potential)
+
+    if relaxation and not rejected(findings):
+        findings += screen_relaxation(config, stride)
+
+    for f in findings:
+        logger.log(logging.WARNING if f["level"] == "reject" else logging.INFO,
+                   f"screening {f['level']} ({f['check']}): {f['message']}")
+
+    return findings
+
+
+def rejected(findings):
+
+    return any(f["level"] == "reject" for f in findings)
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Dual-based sensitivity report
+#
+# After the solve of a stage the duals (and right-hand sides) of the custom constraints are
+# written to <results_dir>/<stage>.duals.nc, with the RHS ranging of the solver where it is
+# available (gurobi after a simplex or crossover solve). The report turns them, together with
+# the bound duals and bus prices of the exported network, into marginal objective changes
+# per unit of the scenario parameters:
+#   res_share        dual of country_res_constraints_DE * total load / 100  [EUR per %-point]
+#   offtake_volume   weighted CI H2 bus price + RES target share of the ely demand [EUR per MWh/h]
+#   ely_cap          electrolyser capacity duals, split by capacity share [EUR per MW]
+#   hourly matching  dual of RES_hourly_excess per snapshot, the value of 1 MWh of excess
+#   charger ratio    dual of Link-charger_ratio per CI battery [EUR per MW]
+# Estimates are first order, valid within the reported range.
+
+
+def solver_ranging(n):
+    '''
+    RHS ranging (low, up) of all constraints of the solver model by constraint name ("c<label>"),
+    None if unavailable (no gurobi model, or a barrier solve without crossover)
+    '''
+    solver_model = getattr(n.model, "solver_model", None)
+    if solver_model is None or not hasattr(solver_model, "getConstrs"):
+        return None
+
+    try:
+        constrs = solver_model.getConstrs()
+        return pd.DataFrame({"low": solver_model.getAttr("SARHSLow", constrs),
+                             "up": solver_model.getAttr("SARHSUp", constrs)},
+                            index=solver_model.getAttr("ConstrName", constrs))
+    except Exception as e:
+        logger.info(f"no RHS ranging ({e})")
+        return None
+
+
+def _ranging(n, name, ranging):
+    '''
+    RHS ranging (low, up) of constraint `name` from solver_ranging, NaN if unavailable
+    '''
+    labels = n.model.constraints[name].labels.values.ravel()
+    if ranging is None:
+        return np.full(len(labels), np.nan), np.full(len(labels), np.nan)
+
+    values = ranging.reindex([f"c{label}" for label in labels])
+    return values["low"].values, values["up"].values
+
+
+def persist_duals(n, config, stage, results_dir):
+    '''
+    Duals, RHS and ranging of the constraints in config["sensitivity"]["constraints"]
+    '''
+    sensitivity = config.get("sensitivity", {})
+    if not sensitivity.get("enabled", False) or stage.split("-")[0] not in sensitivity.get("stages", []):
+        return
+
+    ranging = solver_ranging(n)
+    data = {}
+    for name in sensitivity.get("constraints", []):
+        if name not in n.model.constraints:
+            continue
+        con = n.model.constraints[name]
+        dims = con.dual.dims
+        low, up = _ranging(n, name, ranging)
+        data[f"{name}/dual"] = con.dual
+        data[f"{name}/rhs"] = con.rhs
+        data[f"{name}/rhs_low"] = (dims, low.reshape(con.dual.shape))
+        data[f"{name}/rhs_up"] = (dims, up.reshape(con.dual.shape))
+
+    if not data:
+        return
+
+    path = results_dir + stage + ".duals.nc"
+    ds = xr.Dataset({k.replace("/", "-"): v for k, v in data.items()})
+    # scenario parameters of the run, the report does not depend on the current config.yaml
+    ds.attrs = {f"scenario.{k}": v if isinstance(v, (int, float)) and not isinstance(v, bool) else str(v)
+                for k, v in config["scenario"].items()}
+    # coordinates of linopy are not always netCDF-safe (index names)
+    ds = ds.reset_coords(drop=True)
+    for dim in ds.dims:
+        if dim in ds.coords:
+            ds[dim] = ds[dim].astype(str)
+    ds.to_netcdf(path)
+
+    logger.info(f"duals of {list(sensitivity['constraints'])} written to {path}")
+
+
+#########################################################################################
+def _dual(ds, name):
+
+    key = f"{name}-dual"
+    return ds[key] if key in ds else None
+
+
+def sensitivity_report(n, duals, config):
+    '''
+    Marginal objective change per unit of the scenario parameters from the solved network `n`
+    and its duals dataset
+    '''
+    s = {**config["scenario"],
+         **{k.split(".", 1)[1]: v for k, v in duals.attrs.items() if k.startswith("scenario.")}}
+    efficiency = config["global"]["electrolyser"]["efficiency"]
+    weights = n.snapshot_weightings.objective
+    name = config["ci"]["name"]
+    rows = []
+
+    # RES target: RHS = share * total load
+    res = _dual(duals, "country_res_constraints_DE")
+    if res is not None:
+        rhs = float(duals["country_res_constraints_DE-rhs"])
+        total_load = rhs / (s["res_share"] / 100)
+        low, up = float(duals["country_res_constraints_DE-rhs_low"]), float(duals["country_res_constraints_DE-rhs_up"])
+        rows.append({"parameter": "res_share", "unit": "EUR per %-point",
+                     "marginal": float(res) * total_load / 100,
+                     "range_low": low / total_load * 100, "range_up": up / total_load * 100})
+
+    # offtake volume: H2 balance of the CI H2 bus and the electrolysis demand in the RES target
+    h2_bus = f"{name} H2"
+    if h2_bus in n.buses_t.marginal_price:
+        marginal = float(weights @ n.buses_t.marginal_price[h2_bus].reindex(weights.index))
+        if res is not None:
+            marginal += float(res) * s["res_share"] / 100 * weights.sum() / efficiency
+        rows.append({"parameter": "offtake_volume", "unit": "EUR per MWh_H2/h", "marginal": marginal,
+                     "range_low": np.nan, "range_up": np.nan})
+
+    # electrolyser capacity: capacity duals of the electrolysers, scaled with their share
+    elys = n.links.index[n.links.index.str.endswith(f"{name} H2 Electrolysis")]
+    if "mu_upper" in n.links_t and len(elys) and n.links.p_nom[elys].sum() > 0:
+        mu = n.links_t.mu_upper.reindex(index=weights.index, columns=elys).fillna(0).abs()
+        share = n.links.p_nom[elys] / n.links.p_nom[elys].sum()
+        rows.append({"parameter": "ely_cap", "unit": "EUR per MW", "marginal": -float((weights @ mu) @ share),
+                     "range_low": np.nan, "range_up": np.nan})
+
+    # hourly matching: value of allowing 1 MWh excess in a snapshot
+    hourly = _dual(duals, "RES_hourly_excess")
+    if hourly is not None:
+        values = np.abs(hourly.values.ravel())
+        rows.append({"parameter": "hourly_matching_mean", "unit": "EUR per MWh excess",
+                     "marginal": float(values.mean()), "range_low": float(values.min()), "range_up": float(values.max())})
+        rows.append({"parameter": "hourly_matching_total", "unit": "EUR per MWh/h excess in every snapshot",
+                     "marginal": float(values @ weights.values), "range_low": np.nan, "range_up": np.nan})
+
+    # battery charger ratio
+    ratio = _dual(duals, "Link-charger_ratio")
+    if ratio is not None:
+        values = np.abs(ratio.values.ravel())
+        rows.append({"parameter": "charger_ratio", "unit": "EUR per MW", "marginal": float(values.mean()),
+                     "range_low": float(values.min()), "range_up": float(values.max())})
+
+    return pd.DataFrame(rows).set_index("parameter") if rows else pd.DataFrame()
+
+
+def results_dir_report(results_dir, config, stage="o", suffix=""):
+    '''
+    Sensitivity report of a solved stage in `results_dir`, `suffix` of the run mode ("-r", "-19")
+    '''
+    from .export import load_delta_network
+
+    with xr.open_dataset(os.path.join(results_dir, stage + suffix + ".duals.nc")) as duals:
+        duals.load()
+    n = load_delta_network(os.path.join(results_dir, stage + suffix + ".nc"))
+    return sensitivity_report(n, duals, config)
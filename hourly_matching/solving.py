@@ -0,0 +1,345 @@
+import os
+import time
+
+import yaml
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .artifacts import persist_model
+from .config_keys import config_hash
+from .aliases import resolved
+from .resources import phase, set_phase
+from .sensitivity import persist_duals
+from .warmstart import prepare_warmstart, warmstart_stage, warmstart_method, solution_start, write_start, \
+    save_structure
+
+
+#########################################################################################
+# Solver backend
+#
+# config["solving"]["backend"] holds a neutral option set that is translated for the selected
+# solver. The raw options in config["solving"]["solver"] replace translated options of the
+# same name (case-insensitive) if they belong to the selected solver. Without a backend
+# section the raw options are used as before.
+
+# neutral option -> (solver option, value map or None)
+SOLVER_OPTIONS = {
+    "gurobi": {
+        "method": ("Method", {"auto": -1, "primal_simplex": 0, "dual_simplex": 1, "barrier": 2}),
+        "threads": ("Threads", None),
+        "tolerance": ("BarConvTol", None),
+        "crossover": ("Crossover", {True: -1, False: 0}),
+        "seed": ("Seed", None),
+    },
+    "highs": {
+        "method": ("solver", {"auto": "choose", "primal_simplex": "simplex",
+                              "dual_simplex": "simplex", "barrier": "ipm"}),
+        "threads": ("threads", None),
+        "tolerance": ("ipm_optimality_tolerance", None),
+        "crossover": ("run_crossover", {True: "on", False: "off"}),
+        "seed": ("random_seed", None),
+    },
+    "cplex": {
+        "method": ("lpmethod", {"auto": 0, "primal_simplex": 1, "dual_simplex": 2, "barrier": 4}),
+        "threads": ("threads", None),
+        "tolerance": ("barrier.convergetol", None),
+        "crossover": ("solutiontype", {True: 1, False: 2}),
+        "seed": ("randomseed", None),
+    },
+    "cbc": {
+        "threads": ("threads", None),
+    },
+    "glpk": {},
+}
+
+
+def backend_options(config, solving=None):
+
+    solving = config["solving"] if solving is None else solving
+    return solving.get("backend", config["solving"].get("backend", None))
+
+
+def available_solvers():
+
+    import linopy
+    return linopy.available_solvers
+
+
+def select_solver(backend):
+    '''
+    Configured solver, or with "auto" the first installed solver of the preference list
+    '''
+    if backend.get("solver", "auto") != "auto":
+        return backend["solver"]
+
+    installed = available_solvers()
+    for solver in backend.get("preference", list(SOLVER_OPTIONS)):
+        if solver in installed:
+            return solver
+
+    raise RuntimeError(f"none of the preferred solvers is installed, available: {installed}")
+
+
+def translate_options(solver_name, backend):
+    '''
+    Neutral options (method, threads, tolerance, crossover, seed) as options of `solver_name`
+    '''
+    mapping = SOLVER_OPTIONS.get(solver_name, {})
+
+    options = {}
+    for key, value in backend.items():
+        if key in ["solver", "preference"] or value is None:
+            continue
+        if key not in mapping:
+            logger.info(f"option {key} not supported for solver {solver_name}, ignored")
+            continue
+        name, values = mapping[key]
+        options[name] = values[value] if values is not None else value
+
+    # simplex choice of HiGHS is a separate option
+    if solver_name == "highs" and backend.get("method") in ["primal_simplex", "dual_simplex"]:
+        options["simplex_strategy"] = 4 if backend["method"] == "primal_simplex" else 1
+
+    return options
+
+
+def _set_options(options, new):
+    '''
+    Set `new` in `options`, replacing existing keys case-insensitively (solver options are
+    case-insensitive, Method/method)
+    '''
+    for name, value in new.items():
+        for k in [k for k in options if k.lower() == name.lower()]:
+            del options[k]
+        options[name] = value
+    return options
+
+
+def solver_settings(config, solving=None, overrides=None):
+    '''
+    Solver name and options for the solving section.
+    Raw options replace the translated backend options of the same name, neutral `overrides`
+    (e.g. the method picked by select_stage_settings) take precedence over both.
+    '''
+    solving = config["solving"] if solving is None else solving
+    backend = backend_options(config, solving)
+    raw = {k: v for k, v in solving.get('solver', {}).items() if k != 'name'}
+
+    if backend is None:
+        return solving['solver']['name'], _set_options({}, raw)
+
+    solver_name = select_solver(backend)
+    options = translate_options(solver_name, backend)
+
+    if solving.get('solver', {}).get('name') == solver_name:
+        _set_options(options, raw)
+
+    if overrides:
+        _set_options(options, translate_options(solver_name, overrides))
+
+    return solver_name, options
+
+
+def solve_kwargs(config, solving=None, selected=None):
+    '''
+    Keyword arguments for n.optimize from the solving section.
+    `selected` holds the method chosen by select_stage_settings.
+    '''
+    solving = config["solving"] if solving is None else solving
+    selected = {} if selected is None else selected
+
+    overrides = {"method": selected["method"]} if selected.get("method") else None
+    solver_name, solver_options = solver_settings(config, solving, overrides)
+    kwargs = dict(
+        formulation=solving['options']['formulation'],
+        solver_name=solver_name,
+        solver_options=solver_options,
+    )
+
+    return kwargs
+
+
+def optimize(n, config, extra_functionality=None, solving=None, stage=None, results_dir=None):
+    '''
+    Build and solve `n` with the settings of config["solving"] (or `solving`, e.g. s2019).
+    `stage` (o, o2, m, n, n_custom) names the stage for model artifacts and the report.
+    With `results_dir`, warm starts of config["solving"]["warmstart"] are read and written there.
+    '''
+    selected = select_stage_settings(n, config, stage, extra_functionality, solving)
+    if results_dir is not None and warmstart_stage(config, stage):
+        # a basis is only written and used by simplex
+        selected = {**selected, "method": warmstart_method(config)}
+    kwargs = solve_kwargs(config, solving, selected)
+
+    start_from = None
+    if results_dir is not None and stage is not None:
+        warm_kwargs, start_from = prepare_warmstart(n, config, stage, results_dir, kwargs["solver_name"])
+        kwargs.update(warm_kwargs)
+
+    logger.info(f"solver {kwargs['solver_name']} with options {kwargs['solver_options']}")
+
+    times = {"start": time.time()}
+
+    def stage_functionality(n, snapshots):
+
+        if extra_functionality is not None:
+            extra_functionality(n, snapshots)
+
+        # model complete, before solving
+        persist_model(n, config, stage)
+        if start_from is not None:
+            write_start(kwargs["warmstart_fn"], solution_start(n, start_from))
+        times["built"] = time.time()
+        set_phase("solve")
+
+    # compact time series (config["compact"]) are upcast for the build
+    from .compact import full_precision
+
+    with phase("build"), resolved(n), full_precision(n, config):
+        status, condition = n.optimize(extra_functionality=stage_functionality, **kwargs)
+    set_phase("postprocess")
+
+    if "basis_fn" in kwargs:
+        save_structure(n, config, stage, results_dir)
+
+    if results_dir is not None and stage is not None and status == "ok":
+        persist_duals(n, config, stage, results_dir)
+
+    end = time.time()
+    record(stage,
+           solver=kwargs["solver_name"],
+           solver_options=dict(kwargs["solver_options"]),
+           status=str(status),
+           condition=str(condition),
+           build_time=round(times.get("built", end) - times["start"], 2),
+           solve_time=round(end - times.get("built", end), 2),  # incl. model file and solution read-back
+           solver_runtime=solver_runtime(n.model),
+           nvars=int(n.model.nvars),
+           ncons=int(n.model.ncons),
+           warmstart=os.path.basename(kwargs.get("warmstart_fn", "")) or None)
+
+    return status, condition
+
+
+#########################################################################################
+# Method selection per stage
+#
+# Candidate solver methods are benchmarked on a short slice of the stage's own network (same
+# custom constraints), the fastest is used for the full horizon. Candidates are compared by
+# the runtime the solver reports (Gurobi Runtime, HiGHS run time); for other solvers by the
+# wall time from the end of the model build, which includes writing the model file and
+# reading the solution back. The formulation is not benchmarked: the linopy-based
+# n.optimize builds the same (Kirchhoff) model for every value.
+# The choice is kept per stage, model config and network size until reset_report.
+_selected = {}
+
+
+def solver_runtime(m):
+    '''
+    Runtime [s] reported by the solver of the solved linopy model `m`, None if not available
+    '''
+    solver_model = getattr(m, "solver_model", None)
+    if solver_model is None:
+        return None
+    if hasattr(solver_model, "Runtime"):  # gurobi
+        return float(solver_model.Runtime)
+    if hasattr(solver_model, "getRunTime"):  # highs
+        return float(solver_model.getRunTime())
+    return None
+
+
+def _selection_key(n, config, stage, auto):
+
+    sizes = tuple(len(n.df(c)) for c in ["Bus", "Line", "Link", "Generator", "StorageUnit", "Store"])
+    return (stage, config_hash(config), sizes, len(n.snapshots), tuple(auto["methods"]))
+
+
+def select_stage_settings(n, config, stage, extra_functionality=None, solving=None):
+    '''
+    Fastest solver method for `stage` if enabled in config["solving"]["auto_select"]
+    '''
+    auto = config["solving"].get("auto_select", {})
+    if stage is None or not auto.get("enabled", False) or stage.split("-")[0] not in auto["stages"]:
+        return {}
+
+    solving = config["solving"] if solving is None else solving
+    # methods need the neutral backend options to be translated
+    if backend_options(config, solving) is None:
+        return {}
+
+    key = _selection_key(n, config, stage, auto)
+    if key in _selected:
+        return _selected[key]
+
+    sample = n.copy(snapshots=n.snapshots[:auto.get("snapshots", 48)])
+
+    built = {}
+
+    def timed_functionality(n, snapshots):
+
+        if extra_functionality is not None:
+            extra_functionality(n, snapshots)
+        # model complete, the solver starts
+        built["time"] = time.time()
+
+    timings, clock = {}, "solver"
+    for method in auto["methods"]:
+        kwargs = solve_kwargs(config, solving, {"method": method})
+        c = sample.copy()
+        built.clear()
+        try:
+            with resolved(c):
+                status, condition = c.optimize(extra_functionality=timed_functionality, **kwargs)
+        except Exception as e:
+            logger.info(f"stage {stage}: method {method} failed ({e})")
+            continue
+        if status == "ok":
+            runtime = solver_runtime(c.model)
+            if runtime is None:
+                runtime, clock = time.time() - built["time"], "wall"
+            timings[method] = runtime
+
+    if not timings:
+        logger.warning(f"stage {stage}: no method solved, keep configured settings")
+        _selected[key] = {}
+        return _selected[key]
+
+    method = min(timings, key=timings.get)
+    _selected[key] = {"method": method}
+
+    logger.info(f"stage {stage}: selected method {method} "
+                f"({round(timings[method], 2)} s {clock} time on {len(sample.snapshots)} snapshots)")
+    record(stage, auto_select={m: round(t, 2) for m, t in timings.items()}, auto_select_clock=clock,
+           method=method)
+
+    return _selected[key]
+
+
+#########################################################################################
+# Performance report: one entry per stage, written next to the results
+_report = {}
+
+
+def record(stage, **entries):
+    '''
+    Add `entries` to the performance report of `stage`
+    '''
+    _report.setdefault(str(stage), {}).update(entries)
+
+
+def write_performance_report(path):
+    '''
+    Write the performance report of all stages of this run as yaml
+    '''
+    with open(path, "w") as f:
+        yaml.dump(_report, f, sort_keys=False, default_flow_style=False)
+
+
+def reset_report():
+    '''
+    Start an empty performance report, e.g. for the next run in the same process.
+    Also forgets the methods selected for the previous run.
+    '''
+    _report.clear()
+    _selected.clear()
@@ -0,0 +1,210 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################
+# Warm starts from a neighbouring scenario of a sweep
+#
+# The sweep orders its scenarios by similarity and passes each run the results directory of
+# the previous (nearest) one in solving.warmstart.from. A stage then starts from
+#   - the neighbour's basis (<stage>.bas), if both models have the same structure
+#     (same snapshots, components, extendability and custom constraint settings), or
+#   - a primal start built from the neighbour's solved network (<stage>.nc), mapped by
+#     component name onto the variables of the new model (gurobi, MIP models only: a .sol
+#     start of an LP is ignored by the solver).
+# Barrier without crossover neither writes nor uses a basis, warm-started stages are solved
+# with solving.warmstart.method (dual simplex by default).
+
+# basis files are read and written by linopy for these solvers
+BASIS_SOLVERS = ["gurobi", "cplex", "highs"]
+
+# model variable -> solution in the solved network
+SOLUTION = {
+    "Generator-p": ("generators_t", "p"),
+    "Generator-p_nom": ("generators", "p_nom_opt"),
+    "Link-p": ("links_t", "p0"),
+    "Link-p_nom": ("links", "p_nom_opt"),
+    "Line-s": ("lines_t", "p0"),
+    "Line-s_nom": ("lines", "s_nom_opt"),
+    "Store-e": ("stores_t", "e"),
+    "Store-p": ("stores_t", "p"),
+    "Store-e_nom": ("stores", "e_nom_opt"),
+    "StorageUnit-p_dispatch": ("storage_units_t", "p_dispatch"),
+    "StorageUnit-p_store": ("storage_units_t", "p_store"),
+    "StorageUnit-state_of_charge": ("storage_units_t", "state_of_charge"),
+    "StorageUnit-p_nom": ("storage_units", "p_nom_opt"),
+}
+
+# config entries that add or remove custom constraints
+_STRUCTURE_KEYS = [("scenario", "operation_mode"), ("scenario", "excess"), ("global", "dummies")]
+
+
+def structure_key(n, config):
+    '''
+    Hash of what decides the model structure of `n`
+    '''
+    h = hashlib.sha1()
+    h.update(pd.Index(n.snapshots).astype(str).str.cat(sep=",").encode())
+    for c in n.iterate_components():
+        h.update(c.name.encode())
+        h.update(c.df.index.str.cat(sep=",").encode())
+        for attr in [a for a in c.df.columns if a.endswith("_extendable")]:
+            h.update(c.df[attr].values.tobytes())
+    h.update(json.dumps([config[s].get(k) for s, k in _STRUCTURE_KEYS], default=str).encode())
+    return h.hexdigest()
+
+
+def solution_start(n, solved):
+    '''
+    Start values of the variables of n.model from the solution of network `solved`
+    '''
+    starts = []
+    for name, (table, attr) in SOLUTION.items():
+        if name not in n.model.variables:
+            continue
+        source = getattr(solved, table)
+        if attr not in (source if table.endswith("_t") else source.columns):
+            continue
+
+        labels = n.model.variables[name].labels.to_pandas()
+        if labels.ndim == 2:
+            values = source[attr].reindex(index=labels.index, columns=labels.columns)
+        else:
+            values = source[attr].reindex(labels.index)
+
+        labels, values = np.ravel(labels.values), np.ravel(values.values)
+        keep = (labels != -1) & ~np.isnan(values)
+        starts.append(pd.Series(values[keep], index=labels[keep]))
+
+    return pd.concat(starts) if starts else pd.Series(dtype=float)
+
+
+def write_start(path, start):
+    '''
+    Primal start in solution file format, variables named as in the linopy model files
+    '''
+    with open(path, "w") as f:
+        f.write("# primal start from neighbouring scenario\n")
+        f.write("\n".join(f"x{label} {value:.12g}" for label, value in start.items()))
+        f.write("\n")
+
+
+def warmstart_stage(config, stage):
+    '''
+    Whether `stage` is warm started (and writes its basis)
+    '''
+    ws = config["solving"].get("warmstart", {})
+    return stage is not None and ws.get("enabled", False) and stage.split("-")[0] in ws.get("stages", [])
+
+
+def warmstart_method(config):
+    '''
+    Neutral solver method of warm-started stages, a basis needs simplex
+    '''
+    return config["solving"].get("warmstart", {}).get("method", "dual_simplex")
+
+
+def _is_mip(n):
+
+    committable = any(n.df(c).get("committable", pd.Series(dtype=bool)).any() for c in ["Generator", "Link"])
+    modular = any((n.df(c)[attr] > 0).any() for c, attr in [("Generator", "p_nom_mod"), ("Link", "p_nom_mod"),
+                                                          ("Line", "s_nom_mod"), ("Store", "e_nom_mod"),
+                                                          ("StorageUnit", "p_nom_mod")]
+                  if attr in n.df(c))
+    return committable or modular
+
+
+def prepare_warmstart(n, config, stage, results_dir, solver_name):
+    '''
+    Solve kwargs (basis_fn, warmstart_fn) of `stage` and the solved neighbour network for a
+    primal start (None if the neighbour's basis is used or no neighbour is available)
+    '''
+    ws = config["solving"].get("warmstart", {})
+    if not warmstart_stage(config, stage):
+        return {}, None
+
+    kwargs = {}
+    if solver_name in BASIS_SOLVERS:
+        # basis of this run, for the next scenario of the sweep
+        kwargs["basis_fn"] = results_dir + stage + ".bas"
+
+    source = ws.get("from")
+    if not source:
+        return kwargs, None
+    if os.path.abspath(source) == os.path.abspath(results_dir):
+        logger.warning(f"stage {stage}: warm start source {source} is the run's own directory, ignored")
+        return kwargs, None
+
+    key_file = os.path.join(source, stage + ".structure")
+    basis = os.path.join(source, stage + ".bas")
+    if solver_name in BASIS_SOLVERS and os.path.exists(basis) and os.path.exists(key_file):
+        with open(key_file) as f:
+            same = f.read().strip() == structure_key(n, config)
+        if same:
+            logger.info(f"stage {stage}: warm start from basis {basis}")
+            kwargs["warmstart_fn"] = basis
+            return kwargs, None
+
+    solved_path = os.path.join(source, stage + ".nc")
+    if solver_name == "gurobi" and os.path.exists(solved_path) and _is_mip(n):
+        from .export import load_delta_network
+
+        logger.info(f"stage {stage}: primal start from {solved_path}")
+        kwargs["warmstart_fn"] = results_dir + stage + ".start.sol"
+        return kwargs, load_delta_network(solved_path)
+
+    return kwargs, None
+
+
+def save_structure(n, config, stage, results_dir):
+    '''
+    Structure key next to the basis of `stage`
+    '''
+    with open(results_dir + stage + ".structure", "w") as f:
+        f.write(structure_key(n, config))
+
+
+#########################################################################################
+# Sweep order
+def similarity_order(grid):
+    '''
+    Order of the sweep points `grid` (override dicts), each followed by its nearest
+    unvisited neighbour. Numeric values are scaled to their range, other values differ by 1.
+    '''
+    keys = sorted({k for point in grid for k in point})
+
+    def scaled(k, v):
+        values = [p.get(k) for p in grid if isinstance(p.get(k), (int, float))]
+        span = (max(values) - min(values)) if values else 0
+        return (v - min(values)) / span if span and isinstance(v, (int, float)) else v
+
+    points = [{k: scaled(k, p.get(k)) for k in keys} for p in grid]
+
+    def distance(a, b):
+        return sum(abs(a[k] - b[k]) if isinstance(a[k], (int, float)) and isinstance(b[k], (int, float))
+                   else float(a[k] != b[k]) for k in keys)
+
+    order, left = [0], set(range(1, len(grid)))
+    while left:
+        nearest = min(left, key=lambda i: distance(points[order[-1]], points[i]))
+        order.append(nearest)
+        left.remove(nearest)
+
+    return order if grid else []
+
+
+def sweep_chains(grid, chains):
+    '''
+    Split the similarity order of `grid` into `chains` contiguous chains, solved one after
+    another, each point warm started from its predecessor
+    '''
+    order = similarity_order(grid)
+    size = -(-len(order) // max(chains, 1))
+    return [order[i:i + size] for i in range(0, len(order), size)]
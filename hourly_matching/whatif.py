@@ -0,0 +1,116 @@
+import os
+import copy
+
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .postprocessing import stage_kpis
+
+
+#########################################################################################
+# Line-rating what-ifs on a solved CM stage
+#
+# changes:   {"Line": {name: new s_nom}, "Link": {name: new p_nom}}
+# corridors: [{"component": "Line", "name": ..., "bus0": ..., "bus1": ..., "s_nom": ..., ...}]
+#
+# The marginal effect is estimated from the duals of the line and link limits (first order,
+# valid for small changes). The re-solve copies the solved stage, applies the changes and
+# starts from the stage's basis (same structure: only ratings change) or, for new corridors,
+# from its solution (see warmstart.py). KPIs are reported as deltas to the solved stage.
+
+RATING = {"Line": ("s_nom", "s_max_pu"), "Link": ("p_nom", "p_max_pu")}
+
+
+def marginal_effect(n, changes):
+    '''
+    First-order change of the objective of solved `n` [EUR] per changed line or link.
+    The duals of the limits are per snapshot of the objective, i.e. already weighted.
+    '''
+    effects = []
+    for c, new in changes.items():
+        attr, pu = RATING[c]
+        names = pd.Index(list(new))
+        delta = pd.Series(new, dtype=float)[names] - n.df(c).loc[names, attr]
+
+        pnl = n.pnl(c)
+        mu = sum(pnl[k].reindex(index=n.snapshots, columns=names).fillna(0).abs().values
+                 for k in ["mu_upper", "mu_lower"] if k in pnl and not pnl[k].empty)
+        if isinstance(mu, int):
+            logger.warning(f"no duals of the {c} limits in the solved network")
+            mu = np.zeros((len(n.snapshots), len(names)))
+
+        value = mu.sum(axis=0)  # EUR per MW of rating over the horizon
+        effects.append(pd.DataFrame({"component": c, "delta_rating": delta.values,
+                                     "shadow_price": value,
+                                     "estimate": -value * delta.values * n.df(c).loc[names, pu].values},
+                                    index=names))
+
+    return pd.concat(effects) if effects else pd.DataFrame()
+
+
+def apply_changes(n, changes=None, corridors=None):
+    '''
+    New ratings of lines and links and new corridors
+    '''
+    for c, new in (changes or {}).items():
+        attr, _ = RATING[c]
+        new = pd.Series(new, dtype=float)
+        n.df(c).loc[new.index, attr] = new.values
+
+    for corridor in corridors or []:
+        corridor = dict(corridor)
+        n.add(corridor.pop("component"), corridor.pop("name"), **corridor)
+
+
+def kpi_delta(m, base, n, stage):
+    '''
+    Total KPIs of `stage` before and after the what-if
+    '''
+    kpis = []
+    for network in [base, n]:
+        df = stage_kpis({"m": m, stage: network})
+        kpis.append(df[(df.stage == stage) & (df.group == "")].set_index("kpi").value)
+
+    return pd.DataFrame({"base": kpis[0], "what_if": kpis[1], "delta": kpis[1] - kpis[0]})
+
+
+def what_ifs(config, cases, stage="n", mode="scenario", solve=True):
+    '''
+    Evaluate the what-if `cases` ({case name: {"changes": ..., "corridors": ...}}) on the solved
+    `stage` (n or n_custom) of `mode`. Solved stages are loaded from the results directory.
+    Returns {case name: {"estimate": ..., "kpis": ...}}.
+    '''
+    from .pipeline import context, network, solve_stage
+
+    ctx = context(config, mode)
+    base = network(ctx, stage)
+    m = network(ctx, "m")
+
+    # re-solves start from the solved stage, their own files go to a subdirectory
+    config = copy.deepcopy(config)
+    config["solving"]["warmstart"] = {"enabled": True, "stages": [stage], "from": ctx["results_dir"]}
+    whatif_ctx = dict(ctx, config=config, results_dir=ctx["results_dir"] + "whatif/")
+    os.makedirs(whatif_ctx["results_dir"], exist_ok=True)
+
+    results = {}
+    for name, case in cases.items():
+        changes, corridors = case.get("changes", {}), case.get("corridors", [])
+        result = {"estimate": marginal_effect(base, changes)}
+        logger.info(f"what-if {name}: estimated objective change "
+                    f"{round(result['estimate'].estimate.sum() / 1e6, 3) if len(result['estimate']) else 0} Mio")
+
+        if solve:
+            n = base.copy()
+            apply_changes(n, changes, corridors)
+
+            logger.info(f"what-if {name}: solve {stage}")
+            solve_stage(whatif_ctx, n, stage, release_su_fix=ctx["release_su_fix"],
+                        objective_of=m if stage == "n_custom" else None)
+            result["kpis"] = kpi_delta(m, base, n, stage)
+
+        results[name] = result
+
+    return results
@@ -0,0 +1,179 @@
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .network_cache import load_network
+from .horizon import set_horizon
+from .export import load_delta_network, wait_for_exports
+from .component_roles import role_names
+from .reduction import read_busmap, cluster_network
+from .postprocessing import results_dir_kpis
+from .results_store import write_run_to_store
+from .solving import write_performance_report, reset_report
+from .pipeline import context, network
+
+
+#########################################################################################
+# Multi-weather-year batch
+#
+# config["weather_years"]["network_files"] maps years to network files of the same system.
+# The expansion o is solved once, on the network of the representative year or on all years
+# combined (snapshots concatenated, weightings divided by the number of years, so the
+# objective holds the operation of an average year). o2, m, n and n_custom then run for every
+# year in parallel with the capacities of o and the time series of that year, results in
+# <results_dir>/<year>/. KPIs are aggregated across years.
+
+
+def combined_network(config, files):
+    '''
+    One network with the snapshots of all years in `files`, weightings divided by the number of years
+    '''
+    networks = [load_network(path, config) for path in files.values()]
+    n = networks[0].copy()
+
+    snapshots = pd.Index([]).append([y.snapshots for y in networks])
+    if not snapshots.is_unique:
+        raise ValueError("weather years must have distinct snapshots")
+
+    n.set_snapshots(snapshots)
+    n.snapshot_weightings = pd.concat([y.snapshot_weightings for y in networks]) / len(networks)
+
+    for c in n.iterate_components():
+        for attr, df in c.pnl.items():
+            tables = [y.pnl(c.name)[attr] for y in networks]
+            if any(not t.empty for t in tables):
+                c.pnl[attr] = pd.concat(tables).reindex(columns=tables[0].columns)
+
+    logger.info(f"combined {len(networks)} weather years, {len(snapshots)} snapshots")
+    return n
+
+
+def year_network(o, year_n, config):
+    '''
+    Solved expansion `o` (fixed capacities) with the snapshots and time series of network `year_n`
+    '''
+    n = o.copy()
+    n.set_snapshots(year_n.snapshots)
+    n.snapshot_weightings = year_n.snapshot_weightings
+
+    matched = 0
+    for c in year_n.iterate_components():
+        inputs = c.attrs.index[c.attrs.status.str.startswith("Input")]
+        for attr, df in c.pnl.items():
+            if attr not in inputs or df.empty:
+                continue
+            table = n.pnl(c.name)[attr].copy()
+            common = table.columns.intersection(df.columns)
+            table[common] = df[common]
+            n.pnl(c.name)[attr] = table
+            matched += len(common)
+
+    if not matched:
+        raise ValueError("no time series of the weather year match the components of o "
+                         "(clustered differently?)")
+
+    # CI generators with their own copy of the template series (without aliases)
+    p_max_pu = n.generators_t.p_max_pu
+    ci = role_names(n, "Generator", "ci_res", config).intersection(p_max_pu.columns)
+    templates = n.generators.bus[ci] + " " + n.generators.carrier[ci]
+    ci = ci[templates.isin(year_n.generators_t.p_max_pu.columns).values]
+    if len(ci):
+        p_max_pu[ci] = year_n.generators_t.p_max_pu[templates[ci].values].values
+
+    # series not given for the year fall back to the static values
+    for c in n.iterate_components():
+        for attr, df in c.pnl.items():
+            if df.isna().any().any():
+                c.pnl[attr] = df.dropna(axis=1, how="all")
+
+    return n
+
+
+def run_year(config, mode, year, path, results_dir):
+    '''
+    Dispatch stages of one weather year with the capacities of results_dir/o.nc (worker)
+    '''
+    from .cli import setup_logging
+
+    setup_logging(config)
+    reset_report()
+
+    # the dispatch stages of the year are keyed (artifacts, store) by its network file
+    config = copy.deepcopy(config)
+    config["network_file"] = path
+
+    ctx = context(config, mode, results_dir + f"{year}/")
+    o = load_delta_network(results_dir + "o" + ctx["suffix"] + ".nc")
+
+    year_n = load_network(path, config)
+    # reduced runs: cluster the year like the network of the expansion
+    busmap = read_busmap(results_dir)
+    if busmap is not None:
+        year_n = cluster_network(year_n, busmap, config)
+    set_horizon(year_n, config)
+    ctx["networks"]["o"] = year_network(o, year_n, config)
+
+    for stage in ["o2", "m", "n", "n_custom"]:
+        network(ctx, stage, resume=False)
+
+    networks = {s: ctx["networks"][s] for s in ["o", "o2", "m", "n", "n_custom"]}
+    write_run_to_store(networks, config, run=f"{mode}-{year}")
+    write_performance_report(ctx["results_dir"] + "performance.yaml")
+    wait_for_exports()
+
+    return year
+
+
+def aggregate_kpis(results_dir, years, suffix=""):
+    '''
+    Total KPIs per year and their mean, min and max across years
+    '''
+    frames = [results_dir_kpis(results_dir + f"{year}/", suffix).assign(year=year) for year in years]
+    kpis = pd.concat(frames, ignore_index=True)
+    totals = kpis[kpis.group == ""].pivot_table(index=["stage", "kpi"], columns="year", values="value")
+    return totals.assign(mean=totals.mean(axis=1), min=totals.min(axis=1), max=totals.max(axis=1))
+
+
+def run_years(config, mode="scenario", processes=None):
+    '''
+    Expansion once, dispatch stages for every weather year in parallel, aggregated KPIs
+    '''
+    if mode == "2019":
+        # the 2019 validation has no expansion stage o to share across the years
+        raise ValueError("weather years run in mode scenario or ref, not 2019")
+
+    settings = config["weather_years"]
+    files = {str(y): path for y, path in settings["network_files"].items()}
+
+    ctx = context(config, mode)
+    results_dir = ctx["results_dir"]
+
+    if settings.get("expansion", "representative") == "combined":
+        ctx["input_network"] = combined_network(config, files)
+    else:
+        config = copy.deepcopy(config)
+        config["network_file"] = files[str(settings["representative"])]
+        ctx["config"] = config
+
+    reset_report()
+    network(ctx, "o", resume=False)
+    write_performance_report(results_dir + "performance.yaml")
+    wait_for_exports()
+
+    with ProcessPoolExecutor(max_workers=processes or settings.get("processes"),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {year: pool.submit(run_year, config, mode, year, path, results_dir)
+                   for year, path in files.items()}
+        for year, future in futures.items():
+            future.result()
+            logger.info(f"weather year {year} done")
+
+    kpis = aggregate_kpis(results_dir, list(files), ctx["suffix"])
+    kpis.to_csv(results_dir + "kpis_years.csv")
+
+    return kpis
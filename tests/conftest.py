@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the package is run from the repository root (python -m hourly_matching), not installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.aliases import ALIAS, aliased, resolved
+from hourly_matching.export import export_network, load_delta_network
+from hourly_matching.solve_together import add_CI_gen_bat
+
+
+def network_with_ci(alias_series):
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=6, freq="h"))
+    n.madd("Bus", ["a", "b"], carrier="AC")
+    n.madd("Generator", ["a onwind", "a solar", "b onwind"], bus=["a", "a", "b"],
+           carrier=["onwind", "solar", "onwind"], p_nom_max=100., capital_cost=1., marginal_cost=0.)
+    n.generators_t.p_max_pu = pd.DataFrame(np.random.default_rng(0).uniform(0, 1, (6, 3)), n.snapshots,
+                                           ["a onwind", "a solar", "b onwind"])
+    n.add("Generator", "b gas", bus="b", carrier="gas")
+
+    config = {"ci": {"name": "CI", "res_techs": ["onwind", "solar"], "sto_techs": [], "alias_series": alias_series}}
+    add_CI_gen_bat(n, config)
+    return n
+
+
+def test_aliased_ci_generators_have_no_column():
+
+    n = network_with_ci(True)
+
+    assert sorted(aliased(n).index) == ["a CI onwind", "a CI solar", "b CI onwind"]
+    assert "a CI onwind" not in n.generators_t.p_max_pu
+
+
+def test_resolved_series_equal_copies():
+
+    n, copied = network_with_ci(True), network_with_ci(False)
+
+    with resolved(n):
+        assert ALIAS not in n.generators
+        pd.testing.assert_frame_equal(n.generators_t.p_max_pu.sort_index(axis=1),
+                                      copied.generators_t.p_max_pu.sort_index(axis=1))
+    assert sorted(aliased(n).index) == ["a CI onwind", "a CI solar", "b CI onwind"]
+
+
+def test_alias_export_round_trip(tmp_path):
+
+    n, copied = network_with_ci(True), network_with_ci(False)
+    config = {"export": {"asynchronous": False}}
+
+    export_network(n, str(tmp_path / "alias.nc"), config)
+    export_network(copied, str(tmp_path / "copy.nc"), config)
+    loaded, loaded_copy = load_delta_network(str(tmp_path / "alias.nc")), load_delta_network(str(tmp_path / "copy.nc"))
+
+    pd.testing.assert_frame_equal(loaded.generators_t.p_max_pu.sort_index(axis=1),
+                                  loaded_copy.generators_t.p_max_pu.sort_index(axis=1))
+    pd.testing.assert_frame_equal(loaded.generators_t.p_max_pu[["a CI solar"]].set_axis(["a solar"], axis=1),
+                                  loaded.generators_t.p_max_pu[["a solar"]])
+    assert ALIAS not in loaded.generators
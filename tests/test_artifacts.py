@@ -0,0 +1,46 @@
+import copy
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from hourly_matching.artifacts import stage_key
+
+
+CONFIG = {
+    "network_file": "input/elec_s_156.nc",
+    "scenario": {"res_share": 80, "offtake_volume": 1920, "operation_mode": "flexible", "ely_cap": 10000},
+    "ci": {"name": "CI", "res_techs": ["onwind", "solar"]},
+    "global": {"co2_price_2030": 130},
+    "horizon": {"enabled": False},
+    "solving": {"options": {"formulation": "kirchhoff"}, "solver": {"name": "gurobi", "threads": 4}},
+    "artifacts": {"enabled": True, "dir": "artifacts", "stages": ["o"]},
+}
+
+
+@pytest.mark.parametrize("key, value", [("reduction", {"enabled": True, "buses": 30}),
+                                        ("market", {"zones": {"DE": "DE"}}),
+                                        ("compact", {"enabled": True}),
+                                        ("s2019", {"network_file": "input/2019.nc"}),
+                                        ("weather_years", {"expansion": "combined"}),
+                                        ("network_file", "input/2013.nc")])
+def test_key_differs_for_model_sections(key, value):
+
+    other = copy.deepcopy(CONFIG)
+    other[key] = value
+
+    assert stage_key(CONFIG, "o") != stage_key(other, "o")
+
+
+def test_key_differs_for_mode_suffix():
+
+    assert stage_key(CONFIG, "o2") != stage_key(CONFIG, "o2-19")
+
+
+def test_key_ignores_solver_settings():
+
+    other = copy.deepcopy(CONFIG)
+    other["solving"]["solver"]["threads"] = 16
+    other["artifacts"]["dir"] = "elsewhere"
+
+    assert stage_key(CONFIG, "o") == stage_key(other, "o")
@@ -0,0 +1,42 @@
+from hourly_matching.cli import parse_assignments, parse_grid, parser
+
+
+def test_parse_assignments_as_yaml():
+
+    assert parse_assignments(["scenario.ely_cap=8000", "global.dummies=False", "scenario.allocation=uniform"]) \
+        == {"scenario.ely_cap": 8000, "global.dummies": False, "scenario.allocation": "uniform"}
+
+
+def test_parse_grid_combinations():
+
+    grid = parse_grid(["scenario.ely_cap=6000,8000", "scenario.excess=0,20,40"])
+
+    assert len(grid) == 6
+    assert grid[0] == {"scenario.ely_cap": 6000, "scenario.excess": 0}
+    assert grid[-1] == {"scenario.ely_cap": 8000, "scenario.excess": 40}
+
+
+def test_parse_grid_empty():
+
+    assert parse_grid([]) == [{}]
+
+
+def test_kpis_command_arguments():
+
+    args = parser().parse_args(["kpis", "results/a/", "results/b/", "--suffix=-r"])
+
+    assert args.command == "kpis"
+    assert args.results_dirs == ["results/a/", "results/b/"]
+    assert (args.suffix, args.out) == ("-r", "kpis.csv")
+
+
+def test_report_commands_arguments():
+
+    args = parser().parse_args(["sensitivity", "results/a/", "--stage", "n", "--suffix=-19"])
+    assert (args.command, args.results_dirs, args.stage, args.suffix) == ("sensitivity", ["results/a/"], "n", "-19")
+
+    args = parser().parse_args(["predict", "surrogate.yaml", "--set", "global.co2_price_2030=150"])
+    assert parse_assignments(args.set) == {"global.co2_price_2030": 150}
+
+    args = parser().parse_args(["compare", "results/compact/", "results/full/"])
+    assert (args.suffix, args.rtol) == ("", 1e-4)
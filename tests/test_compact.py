@@ -0,0 +1,79 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.compact import compact_series, full_precision
+
+
+def config(**compact):
+
+    return {"compact": {"enabled": True, "dtype": "float32", **compact}}
+
+
+def network():
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=24, freq="h"))
+    n.add("Bus", "a", carrier="AC")
+    n.madd("Generator", ["a solar", "a wind"], bus="a", p_nom=10)
+    values = np.random.default_rng(0).uniform(0, 1, (24, 2))
+    n.generators_t.p_max_pu = pd.DataFrame(values, n.snapshots, ["a solar", "a wind"])
+    n.add("Load", "a load", bus="a", p_set=pd.Series(np.arange(24) / 8, n.snapshots))
+    return n
+
+
+def test_full_precision_restores_float64():
+
+    n = network()
+    original = n.generators_t.p_max_pu.copy()
+    compact_series(n, config())
+    assert (n.generators_t.p_max_pu.dtypes == np.float32).all()
+
+    with full_precision(n, config()):
+        p_max_pu = n.generators_t.p_max_pu
+        assert (p_max_pu.dtypes == np.float64).all()
+        # the float32 values come back exactly, the rounding is that of float32 only
+        np.testing.assert_array_equal(p_max_pu.values, original.values.astype(np.float32).astype(np.float64))
+        np.testing.assert_allclose(p_max_pu.values, original.values, rtol=1e-7)
+        # values exact in float32 are unchanged
+        np.testing.assert_array_equal(n.loads_t.p_set.values.ravel(), np.arange(24) / 8)
+
+    assert (n.generators_t.p_max_pu.dtypes == np.float32).all()
+
+
+def solve(n):
+    '''
+    Stand-in for the solve: float64 output tables
+    '''
+    n.generators_t.p = n.generators_t.p_max_pu * 10 / 3
+
+
+@pytest.mark.parametrize("outputs", [False, True])
+def test_outputs_compacted_only_if_configured(outputs):
+
+    n = network()
+    compact_series(n, config(outputs=outputs))
+
+    with full_precision(n, config(outputs=outputs)):
+        solve(n)
+        p = n.generators_t.p.copy()
+
+    expected = np.float32 if outputs else np.float64
+    assert (n.generators_t.p.dtypes == expected).all()
+    if not outputs:
+        pd.testing.assert_frame_equal(n.generators_t.p, p)
+
+
+def test_disabled_compaction_changes_nothing():
+
+    n = network()
+    original = n.generators_t.p_max_pu.copy()
+
+    compact_series(n, {"compact": {"enabled": False}})
+    with full_precision(n, {}):
+        solve(n)
+
+    pd.testing.assert_frame_equal(n.generators_t.p_max_pu, original)
+    assert (n.generators_t.p.dtypes == np.float64).all()
@@ -0,0 +1,40 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.component_roles import role_names
+
+
+def config(grid_res_techs):
+
+    return {"ci": {"name": "CI"}, "global": {"grid_res_techs": grid_res_techs}}
+
+
+def network():
+
+    n = pypsa.Network()
+    n.add("Bus", "a", carrier="AC")
+    n.madd("Generator", ["a solar", "a gas", "a CI solar", "a gas ramp up"], bus="a",
+           carrier=["solar", "gas", "solar", "gas"])
+    return n
+
+
+def test_roles_follow_config():
+
+    n = network()
+
+    assert list(role_names(n, "Generator", "grid_res", config(["solar"]))) == ["a solar"]
+    assert list(role_names(n, "Generator", "grid_res", config(["solar", "gas"]))) == ["a solar", "a gas", "a gas ramp up"]
+
+
+def test_roles_follow_carriers_and_index():
+
+    n = network()
+    assert list(role_names(n, "Generator", "grid_res", config(["solar"]))) == ["a solar"]
+
+    n.generators.loc["a gas", "carrier"] = "solar"
+    assert list(role_names(n, "Generator", "grid_res", config(["solar"]))) == ["a solar", "a gas"]
+
+    n.add("Generator", "a gas ramp down", bus="a", carrier="gas")
+    assert list(role_names(n, "Generator", "ramp_down", config(["solar"]))) == ["a gas ramp down"]
@@ -0,0 +1,93 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+xr = pytest.importorskip("xarray")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.export import delta_dataset, load_delta_dataset, load_delta_network, write_dataset
+
+
+CONFIG = {"export": {"asynchronous": False, "delta": True, "compression": 0}}
+
+
+def small_network():
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=4, freq="h"))
+    n.madd("Bus", ["a", "b"], carrier="AC")
+    n.add("Line", "ab", bus0="a", bus1="b", s_nom=100, x=0.1)
+    n.madd("Generator", ["a gas", "b wind"], bus=["a", "b"], p_nom=[50, 80], marginal_cost=[60, 0])
+    n.generators_t.p = pd.DataFrame({"a gas": [10., 20, 30, 40], "b wind": [70., 60, 50, 40]}, n.snapshots)
+    n.add("Load", "load", bus="a", p_set=80.)
+    return n
+
+
+def market_model(o2):
+
+    m = o2.copy()
+    m.add("Bus", "BZ", carrier="AC")
+    m.generators.bus = "BZ"
+    m.loads.bus = "BZ"
+    m.generators_t.p = m.generators_t.p * 2
+    m.mremove("Line", m.lines.index)
+    return m
+
+
+def test_delta_round_trip(tmp_path):
+
+    o2 = small_network()
+    m = market_model(o2)
+
+    o2_path, m_path = str(tmp_path / "o2.nc"), str(tmp_path / "m.nc")
+    write_dataset(o2.export_to_netcdf(), o2_path, CONFIG)
+    write_dataset(m.export_to_netcdf(), m_path, CONFIG, parent=o2_path)
+
+    # the delta only stores what differs
+    with xr.open_dataset(m_path) as delta:
+        assert delta.attrs["delta_parent"] == "o2.nc"
+        assert "generators_t_p" in delta.data_vars
+
+    loaded = load_delta_network(m_path)
+
+    pd.testing.assert_series_equal(loaded.generators.bus, m.generators.bus, check_names=False)
+    pd.testing.assert_series_equal(loaded.loads.bus, m.loads.bus, check_names=False)
+    pd.testing.assert_frame_equal(loaded.generators_t.p, m.generators_t.p, check_names=False, check_freq=False)
+    assert loaded.lines.empty
+    assert set(loaded.buses.index) == set(m.buses.index)
+
+
+def test_delta_variables_replace_parent():
+
+    parent = xr.Dataset({"x": ("i", [1., 2.]), "y": ("i", [3., 4.])}, coords={"i": ["a", "b"]})
+    child = xr.Dataset({"x": ("i", [5., 6.]), "y": ("i", [3., 4.])}, coords={"i": ["a", "b"]})
+
+    delta = delta_dataset(child, parent, "parent.nc")
+    assert list(delta.data_vars) == ["x"]
+
+
+def test_delta_load(tmp_path):
+
+    parent = xr.Dataset({"x": ("i", [1., 2.]), "y": ("i", [3., 4.]), "z": ("i", [0., 0.])},
+                        coords={"i": ["a", "b"]})
+    child = xr.Dataset({"x": ("i", [5., 6.]), "y": ("i", [3., 4.])}, coords={"i": ["a", "b"]})
+
+    parent.to_netcdf(tmp_path / "parent.nc")
+    delta_dataset(child, parent, "parent.nc").to_netcdf(tmp_path / "child.nc")
+
+    full = load_delta_dataset(str(tmp_path / "child.nc"))
+    xr.testing.assert_equal(full[["x", "y"]], child)
+    assert "z" not in full
+
+
+def test_delta_load_closes_files(tmp_path):
+
+    o2 = small_network()
+    o2_path, m_path = str(tmp_path / "o2.nc"), str(tmp_path / "m.nc")
+    write_dataset(o2.export_to_netcdf(), o2_path, CONFIG)
+    write_dataset(market_model(o2).export_to_netcdf(), m_path, CONFIG, parent=o2_path)
+
+    load_delta_network(m_path)
+
+    open_files = repr(list(xr.backends.file_manager.FILE_CACHE.keys()))
+    assert str(tmp_path) not in open_files
@@ -0,0 +1,38 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.horizon import set_horizon
+
+
+def hourly_network(hours=48):
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=hours, freq="h"))
+    n.add("Bus", "a", carrier="AC")
+    n.add("Generator", "a solar", bus="a", p_nom=100,
+          p_max_pu=pd.Series(np.tile(np.r_[np.zeros(12), np.ones(12)], hours // 24), n.snapshots))
+    n.add("Load", "load", bus="a", p_set=pd.Series(np.arange(hours, dtype=float), n.snapshots))
+    return n
+
+
+def test_aggregate_means_and_weightings():
+
+    n = hourly_network()
+    set_horizon(n, {"horizon": {"enabled": True, "stride": 24, "aggregate": True}})
+
+    assert len(n.snapshots) == 2
+    assert (n.snapshot_weightings.generators == 24).all()
+    np.testing.assert_allclose(n.generators_t.p_max_pu["a solar"], [0.5, 0.5])
+    np.testing.assert_allclose(n.loads_t.p_set["load"], [11.5, 35.5])
+
+
+def test_stride_keeps_every_nth_hour():
+
+    n = hourly_network()
+    set_horizon(n, {"horizon": {"enabled": True, "stride": 24, "scale_capital_costs": False}})
+
+    assert len(n.snapshots) == 2
+    np.testing.assert_allclose(n.loads_t.p_set["load"], [0., 24.])
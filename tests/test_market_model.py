@@ -0,0 +1,91 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.ED_CM import build_market_model, _exchange_capacities
+
+
+def rewired_copy(n):
+    '''
+    Reference: the former prepare_economic_dispatch, a copy of `n` rewired to the single zone BZ
+    '''
+    m = n.copy()
+    m.generators.loc[:, "bus"] = "BZ"
+    m.storage_units.loc[:, "bus"] = "BZ"
+    m.loads.loc[m.loads["carrier"] == "", "bus"] = "BZ"
+
+    for c in m.iterate_components(m.branch_components):
+        c.df.loc[c.df["carrier"].isin(["DC", "AC"]), ["bus0", "bus1"]] = ["BZ", "BZ"]
+        c.df.loc[~c.df["bus0"].isin(m.buses[~(m.buses.carrier.isin(["AC", "DC"]))].index), "bus0"] = "BZ"
+        c.df.loc[~c.df["bus1"].isin(m.buses[~(m.buses.carrier.isin(["AC", "DC"]))].index), "bus1"] = "BZ"
+        internal = c.df.bus0 == c.df.bus1
+        m.mremove(c.name, c.df.loc[internal].index)
+
+    m.mremove("Bus", m.buses[m.buses.carrier.isin(["AC", "DC"])].index)
+    m.madd("Bus", ["BZ"], x=10., y=51.2, country='DE', v_nom=380, carrier='AC')
+    return m
+
+
+def nodal_network():
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=4, freq="h"))
+    n.madd("Carrier", ["AC", "DC", "H2", "gas", "wind", "H2 electrolysis"])
+    n.madd("Bus", ["a", "b"], carrier="AC", x=[9., 11.], y=[50., 52.], country="DE")
+    n.add("Bus", "c", carrier="DC", x=11., y=52., country="DE")
+    n.add("Bus", "a H2", carrier="H2")
+
+    n.add("Line", "ab", bus0="a", bus1="b", s_nom=100, x=0.1, carrier="AC")
+    n.add("Link", "bc", bus0="b", bus1="c", p_nom=80, p_min_pu=-1, carrier="DC")
+    n.add("Link", "ca converter", bus0="c", bus1="a", p_nom=50, p_min_pu=-1, carrier="")
+
+    n.madd("Generator", ["a gas", "b wind"], bus=["a", "b"], carrier=["gas", "wind"],
+           p_nom=[200, 150], marginal_cost=[60, 0])
+    n.generators_t.p_max_pu["b wind"] = pd.Series([1., 0.5, 0.2, 0.], n.snapshots)
+    n.add("Load", "b load", bus="b", p_set=pd.Series([120., 100., 90., 110.], n.snapshots))
+    n.add("Link", "a electrolysis", bus0="a", bus1="a H2", p_nom=40, efficiency=0.7, carrier="H2 electrolysis")
+    n.add("Load", "a H2 demand", bus="a H2", p_set=14., carrier="H2")
+    return n
+
+
+def test_single_zone_matches_rewired_copy():
+
+    n = nodal_network()
+    m, reference = build_market_model(n), rewired_copy(n)
+
+    for c in ["Bus", "Generator", "Load", "Link", "StorageUnit", "Store", "Line"]:
+        assert sorted(m.df(c).index) == sorted(reference.df(c).index), c
+    for c, cols in [("Generator", ["bus", "p_nom", "marginal_cost"]), ("Load", ["bus"]),
+                    ("Link", ["bus0", "bus1", "p_nom", "efficiency"])]:
+        pd.testing.assert_frame_equal(m.df(c)[cols].sort_index(), reference.df(c)[cols].sort_index(),
+                                      check_dtype=False)
+    pd.testing.assert_frame_equal(m.generators_t.p_max_pu, reference.generators_t.p_max_pu)
+
+
+def test_single_zone_objective_matches_rewired_copy():
+
+    pytest.importorskip("highspy")
+    n = nodal_network()
+    m, reference = build_market_model(n), rewired_copy(n)
+
+    assert m.optimize(solver_name="highs")[0] == "ok"
+    assert reference.optimize(solver_name="highs")[0] == "ok"
+    assert m.objective == pytest.approx(reference.objective)
+
+
+def test_zones_exchange_capacity_without_duplicate_branches():
+
+    n = nodal_network()
+    zones = {"a": "Z1", "b": "Z2", "c": "Z2"}
+    m = build_market_model(n, zones)
+
+    # line a-b and converter c-a cross the zones, the DC link b-c is internal to Z2
+    assert _exchange_capacities(n, pd.Series(zones)) == {("Z1", "Z2"): 150.}
+
+    cross = m.links[m.links.bus0.isin(["Z1", "Z2"]) & m.links.bus1.isin(["Z1", "Z2"])
+                    & (m.links.bus0 != m.links.bus1)]
+    assert list(cross.index) == ["Z1 - Z2 exchange"]
+    assert cross.p_nom.iloc[0] == 150.
+    assert m.lines.empty
@@ -0,0 +1,90 @@
+import os
+import pickle
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.network_cache import cache_dir_for, load_network, _is_valid
+
+
+def input_file(tmp_path):
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=24, freq="h"))
+    n.add("Bus", "a", carrier="AC")
+    n.add("Generator", "a solar", bus="a", p_nom=10, p_max_pu=pd.Series(range(24), n.snapshots) / 24)
+    path = str(tmp_path / "elec.nc")
+    n.export_to_netcdf(path)
+    return path
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_cache_round_trip(tmp_path, mmap):
+
+    path = input_file(tmp_path)
+    config = {"network_cache": {"enabled": True, "dir": str(tmp_path / "cache"), "validate": "stat",
+                                "mmap": mmap, "mmap_min_size": 1}}
+
+    n = load_network(path, config)
+    cache_dir = cache_dir_for(path, config)
+    assert _is_valid(path, cache_dir, "stat")
+    # no temporary files left behind
+    assert not [f for _, _, files in os.walk(cache_dir) for f in files if f.endswith(".tmp")]
+
+    cached = load_network(path, config)
+    pd.testing.assert_frame_equal(cached.generators_t.p_max_pu, n.generators_t.p_max_pu)
+
+
+def test_cache_of_other_pypsa_version_is_invalid(tmp_path):
+
+    path = input_file(tmp_path)
+    config = {"network_cache": {"enabled": True, "dir": str(tmp_path / "cache")}}
+    load_network(path, config)
+
+    meta_file = os.path.join(cache_dir_for(path, config), "meta.pkl")
+    with open(meta_file, "rb") as f:
+        meta = pickle.load(f)
+    assert meta["sha256"] is None  # not hashed under validate: stat
+
+    meta["pypsa"] = "0.0.0"
+    with open(meta_file, "wb") as f:
+        pickle.dump(meta, f)
+    assert not _is_valid(path, cache_dir_for(path, config), "stat")
+
+
+def test_attach_does_not_register_with_the_resource_tracker(monkeypatch):
+
+    from multiprocessing import shared_memory, resource_tracker
+    from hourly_matching.network_cache import _attach
+
+    shm = shared_memory.SharedMemory(create=True, size=16)
+    registered = []
+    monkeypatch.setattr(resource_tracker, "register", lambda name, rtype: registered.append(name))
+    try:
+        attached = _attach(shm.name)
+        attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    assert registered == []
+
+
+def test_missing_or_partial_meta_is_invalid(tmp_path):
+
+    path = input_file(tmp_path)
+    config = {"network_cache": {"enabled": True, "dir": str(tmp_path / "cache")}}
+    load_network(path, config)
+    cache_dir = cache_dir_for(path, config)
+    meta_file = os.path.join(cache_dir, "meta.pkl")
+
+    with open(meta_file, "rb") as f:
+        content = f.read()
+    with open(meta_file, "wb") as f:
+        f.write(content[:len(content) // 2])
+    assert not _is_valid(path, cache_dir, "stat")
+
+    os.remove(meta_file)
+    assert not _is_valid(path, cache_dir, "stat")
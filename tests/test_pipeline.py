@@ -0,0 +1,42 @@
+import pytest
+import yaml
+
+pytest.importorskip("pandas")
+pytest.importorskip("pypsa")
+
+from hourly_matching.pipeline import load_config, results_dir_for
+
+
+@pytest.fixture
+def config_path(tmp_path):
+
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump({
+        "results_dir": "results",
+        "scenario": {"res_share": 80, "offtake_volume": 1920, "operation_mode": "flexible",
+                     "ely_cap": 10000, "allocation": "uniform", "excess": 0},
+        "solving": {"options": {"formulation": "kirchhoff"}, "warmstart": {"from": None}},
+    }))
+    return str(path)
+
+
+def test_results_dir_without_overrides(config_path):
+
+    assert results_dir_for(load_config(config_path), "scenario") == "results/uniform_flexible_1920_10.0GW/"
+
+
+def test_results_dir_per_sweep_point(config_path):
+
+    dirs = {results_dir_for(load_config(config_path, {"scenario.excess": excess}), "scenario")
+            for excess in [0, 20, 30]}
+    assert len(dirs) == 3
+
+
+def test_results_dir_ignores_run_settings(config_path):
+
+    plain = results_dir_for(load_config(config_path), "scenario")
+    assert results_dir_for(load_config(config_path, {"solving.warmstart.from": "results/x/",
+                                                     "export.compression": 0}), "scenario") == plain
+    # keys of the scenario name are already in the name
+    assert results_dir_for(load_config(config_path, {"scenario.ely_cap": 8000}), "scenario") \
+        == "results/uniform_flexible_1920_8.0GW/"
@@ -0,0 +1,96 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.postprocessing import redispatch_kpis, congestion_kpis, ramp_volume
+
+
+def dispatched_network():
+    '''
+    Redispatch stage with a dispatch result: ramp generators on two buses over two months,
+    snapshots of two hours each
+    '''
+    n = pypsa.Network()
+    n.set_snapshots(pd.DatetimeIndex(["2030-01-31 22:00", "2030-02-01 00:00", "2030-02-01 02:00"]))
+    n.snapshot_weightings.loc[:, :] = 2.
+    n.madd("Bus", ["a", "b", "c"], carrier="AC")
+    n.add("Line", "ab", bus0="a", bus1="b", s_nom=100, x=0.1)
+    n.add("Link", "bc", bus0="b", bus1="c", p_nom=50, p_min_pu=-1, carrier="DC")
+    n.add("Link", "b converter", bus0="b", bus1="c", p_nom=10, carrier="")
+
+    n.madd("Generator", ["a gas ramp up", "b coal ramp up", "a gas ramp down", "b wind ramp down", "a gas"],
+           bus=["a", "b", "a", "b", "a"], carrier=["gas", "coal", "gas", "wind", "gas"],
+           marginal_cost=[70., 40., -70., 0., 70.], p_nom=100)
+    n.generators_t.p = pd.DataFrame({"a gas ramp up": [10., 0., 5.], "b coal ramp up": [0., 20., 30.],
+                                     "a gas ramp down": [3., 4., 0.], "b wind ramp down": [1., 0., 2.],
+                                     "a gas": [50., 50., 50.]}, n.snapshots)
+    n.lines_t.p0 = pd.DataFrame({"ab": [100., -99.95, 50.]}, n.snapshots)
+    n.links_t.p0 = pd.DataFrame({"bc": [-50., 10., 49.99], "b converter": [10., 10., 10.]}, n.snapshots)
+    return n
+
+
+def reference_kpis(n, direction):
+    '''
+    Weighted volume and cost of the ramp generators by carrier, bus and month with pandas groupby
+    '''
+    names = n.generators.index[n.generators.index.str.endswith(f" ramp {direction}")]
+    energy = n.generators_t.p[names].mul(n.snapshot_weightings.generators, axis=0)
+    gens = n.generators.loc[names]
+
+    total = energy.sum()
+    return {
+        "carrier": total.groupby(gens.carrier).sum(),
+        "bus": total.groupby(gens.bus).sum(),
+        "cost": (total * gens.marginal_cost).groupby(gens.carrier).sum(),
+        "month": energy.sum(axis=1).groupby(energy.index.month).sum(),
+    }
+
+
+def kpi(rows, name):
+
+    return {group: value for _, k, group, value in rows if k == name}
+
+
+@pytest.mark.parametrize("direction", ["up", "down"])
+def test_redispatch_kpis_match_groupby(direction):
+
+    n = dispatched_network()
+    rows = redispatch_kpis(n, "n")
+    reference = reference_kpis(n, direction)
+
+    for name, key in [(f"ramp_{direction}", "carrier"), (f"ramp_{direction}_bus", "bus"),
+                      (f"ramp_{direction}_cost", "cost"), (f"ramp_{direction}_month", "month")]:
+        expected = {str(g): v for g, v in reference[key].items()}
+        result = kpi(rows, name)
+        if key in ["carrier", "cost"]:
+            expected[""] = reference[key].sum()
+        assert result == pytest.approx(expected), name
+
+    assert ramp_volume(n, f"ramp {direction}") == pytest.approx(reference["carrier"].sum())
+
+
+def test_ramp_down_cost_at_market_price():
+
+    n = dispatched_network()
+    price = np.array([[50., 20.], [60., 20.], [70., 20.]])
+    cost = kpi(redispatch_kpis(n, "n_custom", price=price), "ramp_down_cost")
+
+    # ramping down is valued at the market price minus the marginal cost
+    assert cost["gas"] == pytest.approx(-2 * (3 * (50 + 70) + 4 * (60 + 70)))
+    assert cost["wind"] == pytest.approx(-2 * (1 * 20 + 2 * 20))
+
+
+def test_congestion_hours_match_reference():
+
+    n = dispatched_network()
+    rows = congestion_kpis(n, "n")
+
+    for c, flow, rating in [("line", n.lines_t.p0, n.lines.s_nom),
+                            ("link", n.links_t.p0[["bc"]], n.links.p_nom[["bc"]])]:
+        expected = (flow.abs() >= rating * (1 - 1e-3)).sum()
+        assert kpi(rows, f"congested_hours_{c}") == {**expected.to_dict(), "": expected.sum()}
+
+    # the AC/DC converter is no DC link
+    assert "b converter" not in kpi(rows, "congested_hours_link")
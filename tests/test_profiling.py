@@ -0,0 +1,74 @@
+import os
+import cProfile
+import pstats
+from collections import Counter
+
+import pytest
+
+from hourly_matching.profiling import _sampling_top, _cprofile_collapsed
+
+
+def test_sampling_top_self_and_total():
+
+    stacks = Counter({"main;solve;build": 6, "main;solve": 2, "main;export": 2})
+    lines, hot = _sampling_top(stacks, top=2)
+
+    assert hot == ["build", "solve"]
+    assert lines[1].split() == ["60.0", "60.0", "build"]
+    assert lines[2].split() == ["20.0", "80.0", "solve"]
+
+
+def inner():
+    return sum(i * i for i in range(20000))
+
+
+def outer():
+    return inner() + inner()
+
+
+def test_cprofile_collapsed_caller_callee_pairs():
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    outer()
+    profiler.disable()
+
+    stacks = _cprofile_collapsed(pstats.Stats(profiler))
+    assert "test_profiling:outer;test_profiling:inner" in stacks
+    assert all(count >= 0 for count in stacks.values())
+
+
+def busy():
+    total = 0
+    for _ in range(200):
+        total += inner()
+    return total
+
+
+@pytest.mark.parametrize("mode", ["sampling", "cprofile"])
+def test_profiled_stage_writes_stacks_and_top(tmp_path, mode):
+
+    pytest.importorskip("numpy")
+    pytest.importorskip("pandas")
+    pytest.importorskip("xarray")
+    from hourly_matching import solving
+    from hourly_matching.profiling import profiled
+
+    solving.reset_report()
+    config = {"profiling": {"enabled": True, "stages": ["m"], "mode": mode, "interval": 0.001}}
+    with profiled(config, "m-r", str(tmp_path)):
+        busy()
+    with profiled(config, "n", str(tmp_path)):
+        busy()
+
+    path = os.path.join(str(tmp_path), "profiles", "m-r")
+    with open(path + ".collapsed") as f:
+        lines = f.read().splitlines()
+    assert lines and all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    assert any("test_profiling:inner" in line for line in lines)
+    assert os.path.getsize(path + ".top.txt") > 0
+
+    # only the selected stages are profiled
+    assert not os.path.exists(os.path.join(str(tmp_path), "profiles", "n.collapsed"))
+    assert solving._report["m-r"]["profile"]["mode"] == mode
+    solving.reset_report()
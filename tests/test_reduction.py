@@ -0,0 +1,43 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from hourly_matching.reduction import _allocate, read_busmap, write_busmap, reduction_label
+
+
+def test_allocate_in_proportion_to_load():
+
+    load = pd.DataFrame({"load": [60., 30., 10.], "buses": [20, 20, 20]}, index=["DE0", "FR0", "BE0"])
+    n_clusters = _allocate(load, 10)
+
+    assert n_clusters.to_dict() == {"DE0": 6, "FR0": 3, "BE0": 1}
+
+
+def test_allocate_bounds():
+
+    load = pd.DataFrame({"load": [99., 1., 0.], "buses": [3, 5, 4]}, index=["DE0", "FR0", "BE0"])
+    n_clusters = _allocate(load, 8)
+
+    # at least one cluster per group, no more clusters than buses
+    assert (n_clusters >= 1).all()
+    assert (n_clusters <= load["buses"]).all()
+    assert n_clusters["DE0"] == 3
+
+
+def test_busmap_round_trip(tmp_path):
+
+    busmap = pd.Series(["DE0 0", "DE0 0", "DE0 1", "DE0 1 H2"], index=["1", "2", "3", "3 H2"])
+    results_dir = str(tmp_path) + "/"
+    write_busmap(busmap, results_dir)
+
+    pd.testing.assert_series_equal(read_busmap(results_dir), busmap, check_names=False, check_index_type=False)
+    assert read_busmap(str(tmp_path / "other") + "/") is None
+
+
+def test_reduction_label():
+
+    assert reduction_label({"reduction": {"enabled": False, "buses": 30}}) == ""
+    assert reduction_label({"reduction": {"enabled": True, "buses": 30}}) == "_30b_s0_l1.25"
+    assert reduction_label({"reduction": {"enabled": True, "buses": 30, "seed": 2, "line_length_factor": 1.0}}) \
+        == "_30b_s2_l1"
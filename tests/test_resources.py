@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from hourly_matching import resources
+from hourly_matching.resources import phase, set_phase, Sampler, start_sampler
+
+
+def test_phase_tags_and_restores():
+
+    with phase("prepare", "m"):
+        assert resources._current == {"stage": "m", "phase": "prepare"}
+        set_phase("solve")
+        assert resources._current == {"stage": "m", "phase": "solve"}
+        with phase("export"):
+            # a phase without stage keeps the stage of the enclosing one
+            assert resources._current == {"stage": "m", "phase": "export"}
+        assert resources._current == {"stage": "m", "phase": "solve"}
+
+    assert resources._current == {"stage": None, "phase": None}
+
+
+def test_phase_restored_on_error():
+
+    with pytest.raises(RuntimeError):
+        with phase("build", "n"):
+            raise RuntimeError
+    assert resources._current == {"stage": None, "phase": None}
+
+
+def test_sampler_timeline_follows_phases():
+
+    sampler = Sampler(interval=0.01)
+    sampler.start()
+    with phase("build", "o"):
+        time.sleep(0.1)
+        set_phase("solve")
+        time.sleep(0.1)
+    sampler.stop()
+
+    timeline = sampler.timeline()
+    assert list(timeline.columns) == ["time", "stage", "phase", "rss_mb", "cpu_percent", "threads"]
+    assert timeline.time.iloc[0] == 0 and timeline.time.is_monotonic_increasing
+    tagged = timeline.dropna(subset=["stage"])
+    assert set(tagged.stage) == {"o"} and {"build", "solve"} <= set(tagged.phase)
+    assert (timeline.rss_mb > 0).all() and (timeline.threads >= 1).all()
+
+
+def test_stop_sampler_writes_timeline_and_peaks(tmp_path):
+
+    pytest.importorskip("xarray")
+    from hourly_matching import solving
+    from hourly_matching.resources import stop_sampler
+
+    solving.reset_report()
+    sampler = start_sampler({"resources": {"enabled": True, "interval": 0.01}})
+    with phase("solve", "n"):
+        time.sleep(0.1)
+    timeline = stop_sampler(sampler, str(tmp_path))
+
+    assert len(pd.read_csv(tmp_path / "resources.csv")) == len(timeline)
+    report = solving._report["n"]
+    assert report["peak_rss_phase"] == "solve"
+    assert report["peak_rss_mb"] == pytest.approx(timeline[timeline.stage == "n"].rss_mb.max(), abs=0.1)
+    assert solving._report["run"]["samples"] == len(timeline)
+    solving.reset_report()
+
+
+def test_disabled_sampler():
+
+    assert start_sampler({}) is None
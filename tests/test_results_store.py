@@ -0,0 +1,70 @@
+import copy
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pypsa")
+
+from hourly_matching import results_store
+from hourly_matching.results_store import _partition_dir, _write_parquet, write_run_to_store
+
+
+def config(tmp_path, **scenario):
+
+    return {
+        "results_store": {"enabled": True, "dir": str(tmp_path),
+                          "partition_on": ["allocation", "operation_mode", "offtake_volume", "ely_cap"]},
+        "scenario": {"res_share": 80, "offtake_volume": 1920, "operation_mode": "flexible", "ely_cap": 10000,
+                     "allocation": "uniform", "buses": 156, "excess": 0, "h2_storage": "cavern", **scenario},
+        "global": {"co2_price_2030": 130},
+        "logging_level": "INFO",
+    }
+
+
+@pytest.mark.parametrize("key, value", [("scenario", {"res_share": 70}), ("scenario", {"excess": 20}),
+                                        ("scenario", {"h2_storage": "medium"}), ("scenario", {"buses": 30}),
+                                        ("global", {"co2_price_2030": 200}),
+                                        ("reduction", {"enabled": True, "buses": 30})])
+def test_partition_differs_for_every_model_key(tmp_path, key, value):
+
+    base = config(tmp_path)
+    other = copy.deepcopy(base)
+    other.setdefault(key, {}).update(value)
+
+    assert _partition_dir("kpis", "scenario", base) != _partition_dir("kpis", "scenario", other)
+
+
+def test_partition_ignores_run_settings(tmp_path):
+
+    base = config(tmp_path)
+    other = copy.deepcopy(base)
+    other["logging_level"] = "DEBUG"
+
+    assert _partition_dir("kpis", "scenario", base) == _partition_dir("kpis", "scenario", other)
+
+
+def test_write_parquet_replaces(tmp_path):
+
+    pytest.importorskip("pyarrow")
+
+    path = str(tmp_path / "part.parquet")
+    _write_parquet(pd.DataFrame({"value": [1.]}), path)
+    _write_parquet(pd.DataFrame({"value": [2.]}), path)
+
+    assert pd.read_parquet(path).value.tolist() == [2.]
+    assert [p.name for p in tmp_path.iterdir()] == ["part.parquet"]
+
+
+def test_scenarios_get_own_files(tmp_path, monkeypatch):
+
+    pytest.importorskip("pyarrow")
+
+    kpis = pd.DataFrame({"stage": ["n"], "kpi": ["cm_cost"], "group": [""], "value": [1.]})
+    monkeypatch.setattr(results_store, "run_kpis", lambda networks: kpis)
+    monkeypatch.setattr(results_store, "run_series", lambda networks: pd.DataFrame(
+        columns=["snapshot", "stage", "series", "value"]))
+
+    for res_share in [70, 80]:
+        write_run_to_store({}, config(tmp_path, res_share=res_share))
+
+    assert len(list((tmp_path / "kpis").rglob("part.parquet"))) == 2
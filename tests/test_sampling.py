@@ -0,0 +1,41 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from hourly_matching.sampling import fit_surrogate, predict, sobol_indices
+
+
+BOUNDS = {"a": [0., 1.], "b": [10., 20.]}
+
+
+def test_sobol_indices_of_additive_function():
+
+    # f = 2 a + b' on the unit cube: variances 4/12 and 1/12, no interaction
+    surrogate = {"parameters": ["a", "b"], "bounds": BOUNDS, "degree": 1,
+                 "kpis": {"o.cost": {"coef": [0., 2., 1.]}}}
+    indices = sobol_indices(surrogate, seed=0).loc["o.cost"]
+
+    np.testing.assert_allclose(indices.first_order, [0.8, 0.2], atol=0.03)
+    np.testing.assert_allclose(indices.total, [0.8, 0.2], atol=0.03)
+
+
+def test_quadratic_surrogate_is_exact_on_quadratic_kpi():
+
+    rng = np.random.default_rng(0)
+    points = pd.DataFrame({"a": rng.uniform(0, 1, 20), "b": rng.uniform(10, 20, 20)})
+    kpis = pd.DataFrame({"o.cost": 3 + points.a**2 - 0.5 * points.a * (points.b - 10) / 10})
+
+    surrogate = fit_surrogate(points, kpis, BOUNDS, degree=2)
+
+    assert surrogate["kpis"]["o.cost"]["r2"] == pytest.approx(1.)
+    new = pd.DataFrame({"a": [0.5], "b": [15.]})
+    assert predict(surrogate, new)["o.cost"].iloc[0] == pytest.approx(3 + 0.25 - 0.125)
+
+
+def test_too_few_samples_fall_back_to_linear():
+
+    points = pd.DataFrame({"a": [0., 0.5, 1.], "b": [10., 15., 20.]})
+    surrogate = fit_surrogate(points, pd.DataFrame({"o.cost": [1., 2., 3.]}), BOUNDS)
+
+    assert surrogate["degree"] == 1
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("pypsa")
+
+from hourly_matching import pipeline
+from hourly_matching.screening import screen_relaxation, rejected
+
+
+CONFIG = {"scenario": {}, "horizon": {"enabled": False}}
+
+
+@pytest.mark.parametrize("status, condition, level", [("warning", "infeasible", "reject"),
+                                                       ("warning", "unbounded", "flag"),
+                                                       ("warning", "infeasible_or_unbounded", "flag"),
+                                                       ("warning", "time_limit", "flag"),
+                                                       ("ok", "optimal", None)])
+def test_only_infeasible_relaxation_rejects(monkeypatch, status, condition, level):
+
+    monkeypatch.setattr(pipeline, "context", lambda config, mode, results_dir: {"config": config})
+    monkeypatch.setattr(pipeline, "prepare_system", lambda ctx: None)
+    monkeypatch.setattr(pipeline, "solve_stage", lambda ctx, o, stage, **kwargs: (status, condition))
+
+    findings = screen_relaxation(CONFIG)
+
+    assert [f["level"] for f in findings] == ([level] if level else [])
+    assert rejected(findings) == (level == "reject")
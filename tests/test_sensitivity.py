@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+xr = pytest.importorskip("xarray")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.sensitivity import solver_ranging, _ranging, sensitivity_report, results_dir_report
+
+
+class SolverModel:
+    '''
+    Gurobi-like model with three constraints, counts the attribute queries
+    '''
+    def __init__(self):
+        self.calls = []
+
+    def getConstrs(self):
+        return [0, 1, 2]
+
+    def getAttr(self, attr, constrs):
+        self.calls.append(attr)
+        return {"ConstrName": ["c0", "c1", "c2"], "SARHSLow": [0., 1., 2.], "SARHSUp": [10., 11., 12.]}[attr]
+
+
+def solved(constraints, solver_model):
+
+    model = SimpleNamespace(solver_model=solver_model,
+                            constraints={k: SimpleNamespace(labels=SimpleNamespace(values=np.array(v)))
+                                         for k, v in constraints.items()})
+    return SimpleNamespace(model=model)
+
+
+def test_ranging_in_one_query_per_attribute():
+
+    solver_model = SolverModel()
+    n = solved({"a": [[2, 0]], "b": [[-1]]}, solver_model)
+    ranging = solver_ranging(n)
+
+    low, up = _ranging(n, "a", ranging)
+    np.testing.assert_array_equal(low, [2., 0.])
+    np.testing.assert_array_equal(up, [12., 10.])
+    # masked entries (label -1) have no ranging
+    assert np.isnan(_ranging(n, "b", ranging)[0]).all()
+    assert sorted(solver_model.calls) == ["ConstrName", "SARHSLow", "SARHSUp"]
+
+
+def test_no_ranging_without_gurobi_model():
+
+    n = solved({"a": [[0, 1]]}, None)
+
+    assert solver_ranging(n) is None
+    assert np.isnan(_ranging(n, "a", None)[1]).all()
+
+
+CONFIG = {"scenario": {"res_share": 80}, "global": {"electrolyser": {"efficiency": 0.7}}, "ci": {"name": "CI"}}
+
+
+def duals_dataset():
+
+    return xr.Dataset({"country_res_constraints_DE-dual": 2., "country_res_constraints_DE-rhs": 400.,
+                       "country_res_constraints_DE-rhs_low": 300., "country_res_constraints_DE-rhs_up": 450.})
+
+
+def network():
+
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=2, freq="h"))
+    n.add("Bus", "a", carrier="AC")
+    return n
+
+
+def test_res_share_marginal_and_range():
+
+    report = sensitivity_report(network(), duals_dataset(), CONFIG)
+
+    # RHS 400 at 80 % -> total load 500
+    row = report.loc["res_share"]
+    assert row.marginal == pytest.approx(10.)
+    assert (row.range_low, row.range_up) == (pytest.approx(60.), pytest.approx(90.))
+
+
+def test_report_of_results_dir_uses_mode_suffix(tmp_path):
+
+    results_dir = str(tmp_path) + "/"
+    network().export_to_netcdf(results_dir + "o-r.nc")
+    duals_dataset().to_netcdf(results_dir + "o-r.duals.nc")
+
+    report = results_dir_report(results_dir, CONFIG, "o", suffix="-r")
+
+    assert report.loc["res_share"].marginal == pytest.approx(10.)
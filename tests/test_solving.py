@@ -0,0 +1,86 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("xarray")
+
+from hourly_matching import solving
+from hourly_matching.solving import translate_options, solver_settings, reset_report
+
+
+def test_translate_options_gurobi():
+
+    backend = {"solver": "gurobi", "method": "barrier", "threads": 4, "crossover": False, "tolerance": None}
+    assert translate_options("gurobi", backend) == {"Method": 2, "Threads": 4, "Crossover": 0}
+
+
+def test_translate_options_highs_simplex_strategy():
+
+    options = translate_options("highs", {"method": "dual_simplex", "seed": 1})
+    assert options == {"solver": "simplex", "random_seed": 1, "simplex_strategy": 1}
+
+
+def test_unsupported_options_are_ignored():
+
+    assert translate_options("cbc", {"method": "barrier", "threads": 2}) == {"threads": 2}
+
+
+def test_selected_method_overrides_raw_option():
+
+    config = {"solving": {"backend": {"solver": "gurobi", "method": "barrier"},
+                          "solver": {"name": "gurobi", "method": 2, "BarHomogeneous": 1}}}
+    name, options = solver_settings(config, overrides={"method": "dual_simplex"})
+
+    assert name == "gurobi"
+    assert options == {"BarHomogeneous": 1, "Method": 1}
+
+
+def test_reset_report_forgets_selection():
+
+    solving._selected[("o", "hash")] = {"method": "barrier"}
+    solving.record("o", status="ok")
+    reset_report()
+
+    assert solving._selected == {} and solving._report == {}
+
+
+def test_raw_options_replace_backend_options_case_insensitively():
+
+    config = {"solving": {"backend": {"solver": "gurobi", "method": "barrier", "threads": 20, "seed": 123},
+                          "solver": {"name": "gurobi", "threads": 12, "SEED": 10, "AggFill": 0}}}
+    name, options = solver_settings(config)
+
+    assert options == {"Method": 2, "threads": 12, "SEED": 10, "AggFill": 0}
+
+
+def test_raw_options_of_other_solver_are_ignored():
+
+    config = {"solving": {"backend": {"solver": "highs", "threads": 4},
+                          "solver": {"name": "gurobi", "threads": 12}}}
+
+    assert solver_settings(config) == ("highs", {"threads": 4})
+
+
+def test_without_backend_name_is_no_option():
+
+    config = {"solving": {"solver": {"name": "gurobi", "threads": 12, "Threads": 8}}}
+
+    assert solver_settings(config) == ("gurobi", {"Threads": 8})
+
+
+def test_solver_runtime():
+
+    class Gurobi:
+        Runtime = 1.5
+
+    class Highs:
+        def getRunTime(self):
+            return 2.
+
+    class Model:
+        def __init__(self, solver_model):
+            self.solver_model = solver_model
+
+    assert solving.solver_runtime(Model(Gurobi())) == 1.5
+    assert solving.solver_runtime(Model(Highs())) == 2.
+    assert solving.solver_runtime(Model(None)) is None
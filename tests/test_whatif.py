@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pypsa = pytest.importorskip("pypsa")
+
+from hourly_matching.whatif import marginal_effect, apply_changes
+
+
+def congested_network():
+    '''
+    Cheap generation at a, expensive at b, the line a-b limits the import of b.
+    Snapshots of three hours each.
+    '''
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range("2030-01-01", periods=4, freq="3h"))
+    n.snapshot_weightings.loc[:, :] = 3.
+    n.madd("Bus", ["a", "b"], carrier="AC")
+    n.add("Line", "ab", bus0="a", bus1="b", s_nom=50, s_max_pu=0.8, x=0.1)
+    n.madd("Generator", ["a wind", "b gas"], bus=["a", "b"], p_nom=200, marginal_cost=[10., 70.])
+    n.add("Load", "b load", bus="b", p_set=pd.Series([100., 90., 30., 80.], n.snapshots))
+    return n
+
+
+def test_estimate_from_weighted_duals():
+
+    n = congested_network()
+    n.lines_t.mu_upper = pd.DataFrame({"ab": [180., 180., 0., 180.]}, n.snapshots)
+
+    effect = marginal_effect(n, {"Line": {"ab": 51.}}).loc["ab"]
+
+    # the duals carry the snapshot weighting already, no second weighting
+    assert effect.shadow_price == pytest.approx(540.)
+    assert effect.estimate == pytest.approx(-540. * 1. * 0.8)
+
+
+def test_estimate_matches_resolve():
+
+    pytest.importorskip("highspy")
+    n = congested_network()
+    n.optimize(solver_name="highs")
+
+    estimate = marginal_effect(n, {"Line": {"ab": 51.}}).estimate.sum()
+
+    changed = congested_network()
+    apply_changes(changed, {"Line": {"ab": 51.}})
+    changed.optimize(solver_name="highs")
+
+    # three congested snapshots of 3 h, 0.8 MW more import at 60 EUR/MWh less
+    assert changed.objective - n.objective == pytest.approx(-3 * 3 * 0.8 * 60.)
+    assert estimate == pytest.approx(changed.objective - n.objective)
@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pypsa")
+
+from hourly_matching.years import run_years
+
+
+def test_2019_mode_is_rejected():
+
+    with pytest.raises(ValueError, match="2019"):
+        run_years({}, mode="2019")